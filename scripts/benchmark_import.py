@@ -0,0 +1,599 @@
+#!/usr/bin/env python3
+"""
+Benchmarks for the import scripts, run against synthetic w_register data
+
+Usage: python scripts/benchmark_import.py parser|uploader|connections|adaptive|ids|sinks|shards|compression|staging|payload [rows]
+
+The sinks benchmark loads into the Postgres at DATABASE_URL (needs psycopg2).
+"""
+
+import bisect
+import csv
+import io
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from import_pipeline import (
+    BatchSizer, IdRanges, adaptive_batched, batched, load_id_ranges, parse_records, read_lines, upload_batches
+)
+from parallel_parse import parallel_parse_records
+from postgres_sink import copy_records, insert_records, quote_ident
+from sql_dump import iter_dump_rows, open_dump, sql_literal, zstandard
+from staging import stage_dump
+from supabase_rest import SupabaseRest, csv_body
+
+REGISTER_COLUMNS = [
+    'id', 'branch_id', 'account_id', 'transaction_type', 'transfer_account_id',
+    'transfer_register_id', 'flag', 'date', 'contact_id', 'payment_method',
+    'category_id', 'service_id', 'memo', 'certificate_no', 'amount',
+    'transaction_status', 'or_number', 'check', 'requisition_id', 'updated_by',
+    'created_at', 'updated_at'
+]
+
+MEMOS = ["Payment for TDC", "Client''s refund", "Fuel \\\\ oil", "Cash advance, see notes", ""]
+
+
+def synthetic_register_line(row_id, rng):
+    """One mysqldump-style INSERT line for w_register"""
+    cols = ', '.join(f'`{c}`' for c in REGISTER_COLUMNS)
+    values = [
+        str(row_id), str(rng.randint(0, 5)), str(rng.randint(1, 80)), "'INCOME'",
+        str(rng.choice([0, rng.randint(1, 80)])), '0', "'N'", "'2024-03-14'",
+        str(rng.randint(0, 40000)), "'cash'", str(rng.randint(0, 30)),
+        str(rng.randint(0, 60)), f"'{rng.choice(MEMOS)}'", 'NULL',
+        f'{rng.randint(0, 500000) / 100:.2f}', "'P'", f"'{rng.randint(1000, 99999)}'",
+        "''", 'NULL', str(rng.randint(1, 20)), "'2024-03-14 12:00:00'", "'2024-03-14 12:00:00'"
+    ]
+    return f"INSERT INTO `w_register` ({cols}) VALUES ({', '.join(values)});\n"
+
+
+def synthetic_register_lines(rows, seed=42):
+    rng = random.Random(seed)
+    return [synthetic_register_line(i, rng) for i in range(1, rows + 1)]
+
+
+def legacy_parse_sql_insert(sql_line):
+    """The original per-character parse_sql_insert loop, kept for comparison"""
+    import re
+    if not sql_line.strip().startswith('INSERT INTO `w_register`'):
+        return None
+
+    cols_match = re.search(r'\(([^)]+)\)\s*VALUES', sql_line)
+    if not cols_match:
+        return None
+    columns = [c.strip().replace('`', '') for c in cols_match.group(1).split(',')]
+
+    values_match = re.search(r'VALUES\s*\((.+)\);?\s*$', sql_line)
+    if not values_match:
+        return None
+
+    values_str = values_match.group(1)
+    values = []
+    current = ''
+    in_quotes = False
+    i = 0
+    while i < len(values_str):
+        char = values_str[i]
+        if char == "'" and not in_quotes:
+            in_quotes = True
+            current += char
+        elif char == "'" and in_quotes:
+            if i + 1 < len(values_str) and values_str[i + 1] == "'":
+                current += "''"
+                i += 1
+            else:
+                in_quotes = False
+                current += char
+        elif char == ',' and not in_quotes:
+            values.append(current.strip())
+            current = ''
+        else:
+            current += char
+        i += 1
+    values.append(current.strip())
+
+    result = {}
+    for col, val in zip(columns, values):
+        if val == 'NULL':
+            result[col] = None
+        elif val.startswith("'") and val.endswith("'"):
+            result[col] = val[1:-1].replace("''", "'")
+        else:
+            try:
+                if '.' in val:
+                    result[col] = float(val)
+                else:
+                    result[col] = int(val)
+            except ValueError:
+                result[col] = val
+    return result
+
+
+def synthetic_register_records(rows):
+    """Synthetic w_register rows as record dicts, parsed by the shared tokenizer"""
+    return [dict(zip(columns, values))
+            for columns, values in iter_dump_rows(synthetic_register_lines(rows), 'w_register')]
+
+
+def timed(label, parse, lines):
+    """Time parse(lines), an iterable of records"""
+    start = time.perf_counter()
+    count = 0
+    for record in parse(lines):
+        if record is not None:
+            count += 1
+    elapsed = time.perf_counter() - start
+    print(f"  {label:<12} {count:>9,} rows in {elapsed:7.2f}s ({count / elapsed:,.0f} rows/s)")
+    return elapsed
+
+
+def bench_parser(rows):
+    print(f"Generating {rows:,} synthetic w_register lines...")
+    lines = synthetic_register_lines(rows)
+    size_mb = sum(len(line) for line in lines) / 1e6
+    print(f"  {size_mb:.1f} MB of SQL")
+
+    print("Parsing...")
+    legacy = timed('legacy loop', lambda lines: map(legacy_parse_sql_insert, lines), lines)
+    tokenizer = timed('tokenizer', lambda lines: parse_records(lines, 'w_register', _record), lines)
+    print(f"  Speedup: {legacy / tokenizer:.1f}x")
+
+
+class StubPostgrestHandler(BaseHTTPRequestHandler):
+    """Mimics POST /rest/v1/<table> with a fixed per-request latency"""
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    latency = 0.05
+    seconds_per_mb = 0.0   # extra latency proportional to the payload
+    max_body = None        # larger payloads get 413 Payload Too Large
+    ids = ()               # ascending ids served by GET ?select=id
+    max_rows = 1000        # PostgREST db-max-rows cap
+    offset_seconds_per_row = 0.0  # models Postgres reading and discarding offset rows
+    connections = 0
+    _lock = threading.Lock()
+
+    def setup(self):
+        super().setup()
+        with self._lock:
+            type(self).connections += 1
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        time.sleep(self.latency + len(body) / 1e6 * self.seconds_per_mb)
+        self.send_response(self.status_for(body))
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def do_GET(self):
+        query = urllib.parse.parse_qs(urllib.parse.urlsplit(self.path).query)
+        limit = min(int(query.get('limit', ['1000'])[0]), self.max_rows)
+        offset = int(query.get('offset', ['0'])[0])
+        start = 0
+        if 'id' in query:
+            start = bisect.bisect_right(self.ids, int(query['id'][0].split('.', 1)[1]))
+        time.sleep(self.latency + offset * self.offset_seconds_per_row)
+        page = self.ids[start + offset:start + offset + limit]
+        body = json.dumps([{'id': id} for id in page]).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def status_for(self, body):
+        if self.max_body and len(body) > self.max_body:
+            return 413
+        try:
+            if self.headers.get('Content-Type') == 'text/csv':
+                rows = list(csv.reader(io.StringIO(body.decode('utf-8'))))
+                if not rows or any(len(row) != len(rows[0]) for row in rows):
+                    return 400
+            else:
+                json.loads(body)
+        except ValueError:
+            return 400
+        return 201
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stub_server(latency=0.05, **options):
+    """Start a local PostgREST stand-in; return (server, base_url)
+
+    server.RequestHandlerClass.connections counts TCP connections accepted.
+    """
+    handler = type('Handler', (StubPostgrestHandler,), dict(options, latency=latency, connections=0))
+    server_class = type('Server', (ThreadingHTTPServer,), {'request_queue_size': 128, 'daemon_threads': True})
+    server = server_class(('127.0.0.1', 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+
+def stub_insert_batch(base_url, table='w_register'):
+    """insert_batch as in the bulk_import_* scripts, pointed at base_url"""
+    def insert_batch(records):
+        data = json.dumps(records).encode('utf-8')
+        headers = {'Content-Type': 'application/json', 'Prefer': 'return=minimal'}
+        req = urllib.request.Request(f"{base_url}/rest/v1/{table}", data=data, headers=headers, method='POST')
+        try:
+            with urllib.request.urlopen(req, timeout=30):
+                return True, None
+        except urllib.error.HTTPError as e:
+            return False, f"HTTP {e.code}: {e.read().decode()}"
+        except Exception as e:
+            return False, str(e)
+    return insert_batch
+
+
+def pooled_insert_batch(base_url, table='w_register', pool_size=4):
+    """insert_batch backed by the shared keep-alive client"""
+    client = SupabaseRest(base_url, 'anon', pool_size=pool_size)
+    return lambda records: client.insert(table, records)
+
+
+def bench_uploader(rows):
+    records = synthetic_register_records(rows)
+    server, base_url = start_stub_server(latency=0.05)
+    print(f"Uploading {rows:,} rows in batches of 100 to stub server (50ms latency)...")
+    insert_batch = stub_insert_batch(base_url)
+
+    for concurrency in (1, 2, 4, 8, 16):
+        start = time.perf_counter()
+        sent = failed = 0
+        last_batch = 0
+        for result in upload_batches(batched(records, 100), insert_batch, concurrency):
+            assert result.batch_num == last_batch + 1, "results out of order"
+            last_batch = result.batch_num
+            if result.success:
+                sent += len(result.records)
+            else:
+                failed += len(result.records)
+        elapsed = time.perf_counter() - start
+        print(f"  concurrency {concurrency:>2}: {sent:,} rows ({failed} failed) in {elapsed:6.2f}s "
+              f"({sent / elapsed:,.0f} rows/s)")
+    server.shutdown()
+
+
+def bench_connections(rows):
+    records = synthetic_register_records(rows)
+    concurrency = 4
+    print(f"Uploading {rows:,} rows in batches of 100, {concurrency} in flight, to stub server...")
+
+    def run(label, insert_batch):
+        server, base_url = start_stub_server(latency=0.01)
+        start = time.perf_counter()
+        for result in upload_batches(batched(records, 100), insert_batch(base_url), concurrency):
+            assert result.success, result.error
+        elapsed = time.perf_counter() - start
+        server.shutdown()
+        opened = server.RequestHandlerClass.connections
+        print(f"  {label:<18} {opened:>6,} connections opened ({opened * 10000 / rows:,.0f} per 10k rows) "
+              f"in {elapsed:5.2f}s")
+
+    run('urlopen per batch', stub_insert_batch)
+    run('pooled keep-alive', lambda base_url: pooled_insert_batch(base_url, pool_size=concurrency))
+
+
+def synthetic_user_branch_records(rows):
+    """Narrow w_user_branches-shaped rows"""
+    return [{'user_id': i, 'branch_id': i % 7 + 1} for i in range(1, rows + 1)]
+
+
+def bench_adaptive(rows):
+    wide = synthetic_register_records(rows)
+    narrow = synthetic_user_branch_records(rows)
+    concurrency = 4
+    print(f"Uploading {rows:,} rows, {concurrency} in flight, to a stub with 20ms + 400ms/MB latency "
+          f"and a 2MB body limit...")
+
+    for label, records in (('wide (w_register)', wide), ('narrow (w_user_branches)', narrow)):
+        print(f"  {label}:")
+        for mode in ('fixed 50', 'fixed 100', 'fixed 500', 'adaptive'):
+            server, base_url = start_stub_server(latency=0.02, seconds_per_mb=0.4, max_body=2_000_000)
+            insert_batch = pooled_insert_batch(base_url, pool_size=concurrency)
+            if mode == 'adaptive':
+                sizer = BatchSizer(initial=100, max_size=20000, target_seconds=0.25)
+                batches = adaptive_batched(records, sizer)
+            else:
+                sizer = None
+                batches = batched(records, int(mode.split()[1]))
+            start = time.perf_counter()
+            sent = failed = requests = 0
+            for result in upload_batches(batches, insert_batch, concurrency, sizer):
+                requests += 1
+                if result.success:
+                    sent += len(result.records)
+                else:
+                    failed += len(result.records)
+            elapsed = time.perf_counter() - start
+            server.shutdown()
+            final = f", final size {sizer.size}" if sizer else ""
+            print(f"    {mode:<10} {sent:>7,} rows ({failed} failed) in {requests:>5,} requests, {elapsed:5.2f}s "
+                  f"({sent / elapsed:,.0f} rows/s{final})")
+
+
+def legacy_get_existing_ids(client, table='w_register'):
+    """The original offset-paginated id scan, kept for comparison"""
+    all_ids = set()
+    offset = 0
+    limit = 1000
+    while True:
+        data = client.get_json(f"/rest/v1/{table}?select=id&offset={offset}&limit={limit}")
+        if not data:
+            break
+        for r in data:
+            all_ids.add(r['id'])
+        if len(data) < limit:
+            break
+        offset += limit
+    return all_ids
+
+
+def bench_ids(rows):
+    rng = random.Random(42)
+    # Mostly contiguous ids with occasional deleted rows
+    ids = [i for i in range(1, rows + 1) if rng.random() > 0.001]
+    server, base_url = start_stub_server(latency=0.001, ids=ids, offset_seconds_per_row=2e-8)
+    client = SupabaseRest(base_url, 'anon')
+    print(f"Discovering {len(ids):,} existing ids from a stub (1000-row pages)...")
+
+    for label, load in (
+        ('offset + set', lambda: legacy_get_existing_ids(client)),
+        ('keyset + ranges', lambda: load_id_ranges(client, 'w_register')),
+    ):
+        client.requests_sent = 0
+        start = time.perf_counter()
+        existing = load()
+        elapsed = time.perf_counter() - start
+
+        probes = [rng.randint(1, rows) for _ in range(200_000)]
+        start = time.perf_counter()
+        hits = sum(1 for id in probes if id in existing)
+        lookup = time.perf_counter() - start
+        print(f"  {label:<16} {len(existing):>9,} ids, {client.requests_sent:>5,} requests in {elapsed:5.2f}s, "
+              f"{_id_memory(existing) / 1e3:8,.1f} KB held, 200k lookups in {lookup:.2f}s ({hits:,} hits)")
+    server.shutdown()
+
+
+def _id_memory(existing):
+    """Bytes held by an id set (including the int objects) or an IdRanges"""
+    if isinstance(existing, IdRanges):
+        return 2 * existing.starts.itemsize * existing.intervals()
+    return sys.getsizeof(existing) + sum(sys.getsizeof(id) for id in existing)
+
+
+# Target of the sinks benchmark, shaped like w_register
+BENCH_REGISTER_TABLE = """
+    CREATE TEMP TABLE bench_register (
+        id INTEGER PRIMARY KEY, branch_id INTEGER, account_id INTEGER, transaction_type VARCHAR(50),
+        transfer_account_id INTEGER, transfer_register_id INTEGER, flag VARCHAR(50), date DATE,
+        contact_id INTEGER, payment_method VARCHAR(100), category_id INTEGER, service_id INTEGER,
+        memo TEXT, certificate_no VARCHAR(100), amount DECIMAL(15, 2), transaction_status CHAR(1),
+        or_number VARCHAR(100), "check" VARCHAR(100), requisition_id INTEGER, updated_by INTEGER,
+        created_at TIMESTAMP, updated_at TIMESTAMP
+    )"""
+
+
+def bench_sinks(rows):
+    records = synthetic_register_records(rows)
+    print(f"Loading {rows:,} w_register rows through each sink...")
+
+    def report(label, elapsed):
+        print(f"  {label:<26} {elapsed:7.2f}s ({rows / elapsed:,.0f} rows/s)")
+
+    server, base_url = start_stub_server(latency=0.01)
+    start = time.perf_counter()
+    for result in upload_batches(batched(records, 1000), pooled_insert_batch(base_url), 4):
+        assert result.success, result.error
+    report("REST stub (10 ms), 4 x 1000", time.perf_counter() - start)
+    server.shutdown()
+
+    dsn = os.environ.get('DATABASE_URL')
+    try:
+        import psycopg2
+    except ImportError:
+        psycopg2 = None
+    if not dsn or psycopg2 is None:
+        print("  Set DATABASE_URL (and install psycopg2) to compare the Postgres sinks")
+        return
+
+    conn = psycopg2.connect(dsn)
+    columns = ', '.join(quote_ident(c) for c in REGISTER_COLUMNS)
+
+    def run(label, load):
+        with conn.cursor() as cursor:
+            cursor.execute("DROP TABLE IF EXISTS bench_register")
+            cursor.execute(BENCH_REGISTER_TABLE)
+        conn.commit()
+        start = time.perf_counter()
+        load()
+        report(label, time.perf_counter() - start)
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT COUNT(*) FROM bench_register")
+            assert cursor.fetchone()[0] == rows
+
+    def insert_per_row():
+        # What batch_import_contacts.py does: one pre-rendered INSERT per row
+        with conn.cursor() as cursor:
+            for batch in batched(records, 1000):
+                for record in batch:
+                    values = ', '.join(sql_literal(record[c]) for c in REGISTER_COLUMNS)
+                    cursor.execute(f"INSERT INTO bench_register ({columns}) VALUES ({values})")
+                conn.commit()
+
+    def execute_values():
+        for batch in batched(records, 1000):
+            insert_records(conn, 'bench_register', batch, page_size=500)
+
+    def copy():
+        for batch in batched(records, 20000):
+            copy_records(conn, 'bench_register', batch)
+
+    run('INSERT per row', insert_per_row)
+    run('execute_values, 500/page', execute_values)
+    run('COPY, 20000-row batches', copy)
+    conn.close()
+
+
+def _record(columns, values):
+    return dict(zip(columns, values))
+
+
+def bench_shards(rows):
+    with tempfile.NamedTemporaryFile('w', suffix='.sql', delete=False) as f:
+        print(f"Writing {rows:,} synthetic w_register lines to {f.name}...")
+        f.writelines(synthetic_register_lines(rows))
+    try:
+        print(f"  {os.path.getsize(f.name) / 1e6:.1f} MB of SQL, {os.cpu_count()} CPUs")
+
+        def run(label, records, serial=None):
+            start = time.perf_counter()
+            count = 0
+            last_id = 0
+            for record in records:
+                assert record['id'] > last_id, "rows out of id order"
+                last_id = record['id']
+                count += 1
+            elapsed = time.perf_counter() - start
+            assert count == rows
+            speedup = f", {serial / elapsed:.2f}x" if serial else ''
+            print(f"  {label:<12} {elapsed:7.2f}s ({rows / elapsed:,.0f} rows/s{speedup})")
+            return elapsed
+
+        serial = run('in process', parse_records(read_lines(f.name), 'w_register', _record))
+        for workers in (1, 2, 4, 8):
+            run(f'{workers} workers', parallel_parse_records(f.name, 'w_register', _record, workers), serial)
+    finally:
+        os.unlink(f.name)
+
+
+def bench_compression(rows):
+    lines = synthetic_register_lines(rows)
+    print(f"Writing and parsing {rows:,} synthetic w_register lines per format...")
+    suffixes = ['', '.gz', '.bz2', '.xz'] + (['.zst'] if zstandard else [])
+    plain_size = None
+    directory = tempfile.mkdtemp()
+    try:
+        for suffix in suffixes:
+            path = os.path.join(directory, 'register.sql' + suffix)
+            start = time.perf_counter()
+            with open_dump(path, 'w') as f:
+                f.writelines(lines)
+            write = time.perf_counter() - start
+            size = os.path.getsize(path)
+            plain_size = plain_size or size
+            start = time.perf_counter()
+            count = sum(1 for _ in parse_records(read_lines(path), 'w_register', _record))
+            read = time.perf_counter() - start
+            assert count == rows
+            print(f"  {suffix or 'plain':<6} {size / 1e6:8.1f} MB ({size / plain_size:6.1%})"
+                  f"  write {write:6.2f}s  read+parse {read:6.2f}s")
+        if not zstandard:
+            print("  (pip3 install zstandard to include .zst)")
+    finally:
+        for name in os.listdir(directory):
+            os.unlink(os.path.join(directory, name))
+        os.rmdir(directory)
+
+
+def bench_staging(rows):
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, 'register.sql')
+    with open(path, 'w') as f:
+        print(f"Writing {rows:,} synthetic w_register lines...")
+        f.writelines(synthetic_register_lines(rows))
+    try:
+        def run(label, records, expected=rows):
+            start = time.perf_counter()
+            count = sum(1 for _ in records)
+            elapsed = time.perf_counter() - start
+            assert count == expected
+            print(f"  {label:<26} {elapsed:7.2f}s ({count / elapsed:,.0f} rows/s)")
+            return elapsed
+
+        parse = run('parse dump', parse_records(read_lines(path), 'w_register', _record))
+        start = time.perf_counter()
+        stage = stage_dump(path, 'w_register')
+        staged_bytes = sum(os.path.getsize(os.path.join(stage.path, name)) for name in os.listdir(stage.path))
+        print(f"  {'stage dump (once)':<26} {time.perf_counter() - start:7.2f}s "
+              f"({staged_bytes / 1e6:.1f} MB staged, {os.path.getsize(path) / 1e6:.1f} MB of SQL)")
+        replay = run('replay stage', stage.records(_record))
+        print(f"  Speedup: {parse / replay:.1f}x")
+        low = rows // 2
+        run('replay ids in 1000 range', stage.records(_record, low, low + 999), min(1000, rows - low + 1))
+    finally:
+        for root, dirs, files in os.walk(directory, topdown=False):
+            for name in files:
+                os.unlink(os.path.join(root, name))
+            os.rmdir(root)
+
+
+def bench_payload(rows):
+    records = synthetic_register_records(rows)
+    batches = list(batched(records, 500))
+    print(f"Serializing {rows:,} rows in batches of 500 as JSON and as CSV...")
+    for format in ('json', 'csv'):
+        start = time.perf_counter()
+        if format == 'json':
+            size = sum(len(json.dumps(batch).encode('utf-8')) for batch in batches)
+        else:
+            size = 0
+            for batch in batches:
+                columns = list(batch[0])
+                size += len(csv_body(columns, [[r[c] for c in columns] for r in batch]))
+        elapsed = time.perf_counter() - start
+        print(f"  {format:<4} {size / 1e6:7.1f} MB ({size / rows:5.0f} bytes/row), "
+              f"serialized in {elapsed:5.2f}s ({rows / elapsed:,.0f} rows/s)")
+
+    # 2 s/MB is about a 4 Mbit/s uplink, where the payload size dominates
+    print("Uploading to stub server (10ms latency + 2s/MB), 4 in flight...")
+    for format in ('json', 'csv'):
+        server, base_url = start_stub_server(latency=0.01, seconds_per_mb=2.0)
+        client = SupabaseRest(base_url, 'anon', pool_size=4)
+        start = time.perf_counter()
+        sent = 0
+        for result in upload_batches(iter(batches), lambda b: client.insert('w_register', b, format=format), 4):
+            assert result.success, result.error
+            sent += len(result.records)
+        elapsed = time.perf_counter() - start
+        print(f"  {format:<4} {sent:,} rows in {elapsed:6.2f}s ({sent / elapsed:,.0f} rows/s)")
+        client.close()
+        server.shutdown()
+
+
+# name -> (function, default row count)
+BENCHMARKS = {
+    'parser': (bench_parser, 1_000_000),
+    'uploader': (bench_uploader, 20_000),
+    'connections': (bench_connections, 10_000),
+    'adaptive': (bench_adaptive, 50_000),
+    'ids': (bench_ids, 1_000_000),
+    'sinks': (bench_sinks, 50_000),
+    'shards': (bench_shards, 500_000),
+    'compression': (bench_compression, 200_000),
+    'staging': (bench_staging, 500_000),
+    'payload': (bench_payload, 50_000),
+}
+
+
+def main():
+    name = sys.argv[1] if len(sys.argv) > 1 else 'parser'
+    if name not in BENCHMARKS:
+        print(f"Unknown benchmark {name!r}, choose from: {', '.join(BENCHMARKS)}")
+        sys.exit(1)
+    func, default_rows = BENCHMARKS[name]
+    func(int(sys.argv[2]) if len(sys.argv) > 2 else default_rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -7,6 +7,8 @@ import subprocess
 import json
 import os
 
+from sql_dump import open_dump
+
 # Read SQL file and extract INSERT statements
 sql_file = '/Users/philippebarthelemy/dev/wvdi/wvdi/nextjs/scripts/migrations/contacts_import.sql'
 
@@ -43,7 +45,7 @@ def batch_execute_sql(batch_sql, batch_num):
 def main():
     print("Reading contacts SQL file...")
 
-    with open(sql_file, 'r') as f:
+    with open_dump(sql_file) as f:
         lines = f.readlines()
 
     # Skip header lines (first 4 lines)
@@ -0,0 +1,631 @@
+#!/usr/bin/env python3
+"""
+Streaming import pipeline: read -> parse -> transform -> batch -> send
+
+Every stage is a generator, so memory stays bounded by the batch size and the
+first batch can be sent as soon as its rows are parsed.
+"""
+
+import json
+import os
+import queue
+import re
+import threading
+import time
+from array import array
+from bisect import bisect_right
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from sql_dump import DumpState, dump_source, iter_dump_rows, open_dump
+
+_DONE = object()
+
+# Outcome of sending one batch, yielded by upload_batches in batch order
+BatchResult = namedtuple('BatchResult', 'batch_num records success error elapsed')
+
+# Totals of one run_import; stopped_at is the batch it gave up on, if any
+ImportResult = namedtuple('ImportResult', 'inserted rejected stopped_at')
+
+# HTTP statuses that mean the request was too big or the server is struggling
+# (other 4xx errors don't depend on the batch size)
+_OVERLOAD_STATUSES = {408, 413, 429}
+# Of those, the ones worth resending unchanged (413 needs a smaller batch)
+_TRANSIENT_STATUSES = {408, 429}
+# 4xx statuses PostgREST answers for the rows of a batch (bad values, constraint
+# violations) or their number; any other 4xx (401, 403, 404, ...) fails every batch
+_ROW_STATUSES = {400, 409, 413, 422}
+_HTTP_STATUS_RE = re.compile(r'HTTP (\d{3})')
+
+RETRY_DELAYS = (1, 4, 15)  # Seconds to wait before each resend of a transiently failed batch
+
+
+class TransientError(Exception):
+    """A batch kept failing for reasons unrelated to its rows (timeouts, 5xx, 408, 429)"""
+
+
+class FatalError(Exception):
+    """A batch failed for a reason no resend or split can fix (401, 403, 404, ...)"""
+
+
+class DumpPosition:
+    """Where the pipeline is in a dump: line byte offset + rows taken from it
+
+    read_lines moves `offset` to the start of each line it yields and
+    parse_records counts the rows it takes from that line, so a snapshot
+    taken right after a record points exactly behind it, even in the middle
+    of an extended INSERT. `state` is the parser's carried-over state.
+    """
+
+    def __init__(self, offset=0, rows=0, state=None):
+        self.offset = offset
+        self.rows = rows
+        self.state = state or DumpState()
+
+    @classmethod
+    def resume(cls, checkpoint):
+        """Position to continue from a journal entry (or the start if None)"""
+        if checkpoint is None:
+            return cls()
+        pending = checkpoint['pending']
+        state = DumpState(
+            {name: tuple(columns) for name, columns in checkpoint['columns'].items()},
+            (pending[0], tuple(pending[1]) if pending[1] else None) if pending else None,
+        )
+        return cls(checkpoint['offset'], checkpoint['rows'], state)
+
+    def snapshot(self):
+        return {
+            'offset': self.offset,
+            'rows': self.rows,
+            'pending': self.state.pending,
+            'columns': {name: columns for name, columns in self.state.table_columns.items()
+                        if isinstance(columns, tuple)},
+        }
+
+
+def read_lines(path, position=None):
+    """Yield the lines of a dump file without loading it all
+
+    Compressed dumps and stdin ('-', see sql_dump.open_dump) are
+    decompressed as they are read. With a DumpPosition, reading starts at
+    position.offset and the position follows the start of each line as it
+    is yielded.
+    """
+    with open_dump(path, 'rb') as f:
+        offset = 0
+        if position is not None and position.offset:
+            offset = position.offset
+            f.seek(offset)  # offsets count uncompressed bytes: decompresses up to there
+        for line in f:
+            if position is not None:
+                position.offset = offset
+                position.rows = 0
+            offset += len(line)
+            yield line.decode('utf-8')
+
+
+def parse_records(lines, table, build_record, position=None):
+    """Yield build_record(columns, values) for every row of `table`
+
+    With a DumpPosition, the first position.rows rows (already committed
+    before a restart) are skipped and every row taken is counted.
+    """
+    if position is None:
+        for columns, values in iter_dump_rows(lines, table):
+            yield build_record(columns, values)
+        return
+
+    skip = position.rows
+    for columns, values in iter_dump_rows(lines, table, position.state):
+        position.rows += 1
+        if skip:
+            skip -= 1
+            continue
+        yield build_record(columns, values)
+
+
+class IdRanges:
+    """Compact set of ids stored as sorted, merged [start, end] intervals
+
+    Ids must be added in ascending order, which is how keyset pagination
+    returns them. A mostly contiguous 1M-row table collapses to a few
+    intervals (16 bytes each) instead of a million ints in a set, and
+    membership is a binary search over the interval starts.
+    """
+
+    def __init__(self):
+        self.starts = array('q')
+        self.ends = array('q')
+        self.count = 0
+
+    def add(self, id):
+        if self.ends:
+            last = self.ends[-1]
+            if id <= last:
+                if id < self.starts[-1]:
+                    raise ValueError(f"ids must be added in ascending order ({id} after {last})")
+                return
+            if id == last + 1:
+                self.ends[-1] = id
+                self.count += 1
+                return
+        self.starts.append(id)
+        self.ends.append(id)
+        self.count += 1
+
+    def __contains__(self, id):
+        if id is None:
+            return False
+        i = bisect_right(self.starts, id) - 1
+        return i >= 0 and id <= self.ends[i]
+
+    def __len__(self):
+        return self.count
+
+    def intervals(self):
+        return len(self.starts)
+
+
+def load_id_ranges(client, table, partial=False):
+    """Every id of table as IdRanges, read with keyset pagination (client.iter_ids)
+
+    If reading fails the error is printed and the ids read so far are
+    returned when `partial`, None otherwise.
+    """
+    ranges = IdRanges()
+    try:
+        for id in client.iter_ids(table):
+            ranges.add(id)
+    except Exception as e:
+        print(f"Error getting {table} IDs after {len(ranges)}: {e}")
+        return ranges if partial else None
+    return ranges
+
+
+def skip_existing(records, existing_ids):
+    """Drop records whose id is already present in the target table"""
+    for record in records:
+        if record.get('id') not in existing_ids:
+            yield record
+
+
+def drop_orphans(records, foreign_keys, key_sets, orphans, counts):
+    """Drop records whose foreign keys point at ids missing from key_sets
+
+    foreign_keys maps a column to its parent table and key_sets a parent
+    table to its ids (IdRanges); columns whose parent has no key set are
+    not checked. Orphans are appended to the `orphans` dead-letter file and
+    counted per column in `counts`, so they never reach the server.
+    """
+    checks = [(column, key_sets[parent]) for column, parent in foreign_keys.items() if parent in key_sets]
+    for record in records:
+        missing = [column for column, keys in checks
+                   if record.get(column) is not None and record[column] not in keys]
+        if not missing:
+            yield record
+            continue
+        for column in missing:
+            counts[column] = counts.get(column, 0) + 1
+        write_rejects(orphans, [(record, 'missing parent: ' + ', '.join(
+            f"{column}={record[column]} not in {foreign_keys[column]}" for column in missing))])
+
+
+class Batch(list):
+    """List of records plus the dump position just behind its last record"""
+
+    checkpoint = None
+
+
+def _close_batch(batch, position):
+    if position is not None:
+        batch.checkpoint = position.snapshot()
+    return batch
+
+
+def batched(records, batch_size, position=None):
+    """Group records into lists of at most batch_size
+
+    With a DumpPosition each batch carries a checkpoint for the journal.
+    """
+    batch = Batch()
+    for record in records:
+        batch.append(record)
+        if len(batch) >= batch_size:
+            yield _close_batch(batch, position)
+            batch = Batch()
+    if batch:
+        yield _close_batch(batch, position)
+
+
+def is_overload_error(error):
+    """True when a failed request says nothing about the rows themselves"""
+    m = _HTTP_STATUS_RE.match(error or '')
+    if not m:
+        return True  # timeouts, resets
+    status = int(m.group(1))
+    return status >= 500 or status in _OVERLOAD_STATUSES
+
+
+def is_transient_error(error):
+    """True when a failed request should be resent as is: timeouts, resets, 5xx, 408, 429"""
+    m = _HTTP_STATUS_RE.match(error or '')
+    if not m:
+        return True
+    status = int(m.group(1))
+    return status >= 500 or status in _TRANSIENT_STATUSES
+
+
+def is_fatal_error(error):
+    """True when a failed request would fail the same way for any rows: 401, 403, 404, ..."""
+    m = _HTTP_STATUS_RE.match(error or '')
+    if not m:
+        return False
+    status = int(m.group(1))
+    return status < 500 and status not in _TRANSIENT_STATUSES and status not in _ROW_STATUSES
+
+
+class BatchSizer:
+    """AIMD batch size controller driven by latency, errors and payload size
+
+    The size doubles (slow start) and, after the first decrease, grows by
+    `step` rows after each full batch answered within target_seconds. It
+    halves after a slow response, a timeout/5xx or a 413/429. It is also
+    capped so one batch stays under max_bytes of JSON, using a running
+    estimate of the serialized row width. Wide rows therefore settle on
+    smaller batches than narrow ones without hand tuning.
+    """
+
+    def __init__(self, initial=100, min_size=10, max_size=5000,
+                 target_seconds=2.0, max_bytes=1_000_000, step=None):
+        self.size = initial
+        self.min_size = min_size
+        self.max_size = max_size
+        self.target_seconds = target_seconds
+        self.max_bytes = max_bytes
+        self.step = step or max(1, initial // 4)
+        self.row_bytes = None
+        self.slow_start = True
+        self.increases = 0
+        self.decreases = 0
+
+    def sample_row(self, record):
+        """Update the serialized row width estimate from one record"""
+        nbytes = len(json.dumps(record)) + 2
+        if self.row_bytes is None:
+            self.row_bytes = nbytes
+        else:
+            self.row_bytes = 0.8 * self.row_bytes + 0.2 * nbytes
+        self._clamp()
+
+    def record(self, rows, elapsed, success, error=None):
+        """Adjust the size after a batch of `rows` finished"""
+        if not success and not is_overload_error(error):
+            return
+        if not success or elapsed > self.target_seconds:
+            self.size //= 2
+            self.slow_start = False
+            self.decreases += 1
+        elif rows >= self.size:
+            self.size = self.size * 2 if self.slow_start else self.size + self.step
+            self.increases += 1
+        self._clamp()
+
+    def _clamp(self):
+        limit = self.max_size
+        if self.row_bytes:
+            limit = min(limit, int(self.max_bytes // self.row_bytes))
+        self.size = max(self.min_size, min(self.size, limit))
+
+
+def adaptive_batched(records, sizer, position=None):
+    """Group records into batches of the sizer's current size"""
+    batch = Batch()
+    for record in records:
+        if not batch:
+            sizer.sample_row(record)
+        batch.append(record)
+        if len(batch) >= sizer.size:
+            yield _close_batch(batch, position)
+            batch = Batch()
+    if batch:
+        yield _close_batch(batch, position)
+
+
+def prefetch(items, depth=4):
+    """Produce `items` in a background thread, keeping up to `depth` ready
+
+    Lets parsing of the next batches overlap with sending the current one.
+    Exceptions raised by the producer are re-raised in the consumer.
+    """
+    q = queue.Queue(maxsize=depth)
+    error = []
+
+    def produce():
+        try:
+            for item in items:
+                q.put(item)
+        except BaseException as e:
+            error.append(e)
+        finally:
+            q.put(_DONE)
+
+    threading.Thread(target=produce, daemon=True).start()
+    while True:
+        item = q.get()
+        if item is _DONE:
+            break
+        yield item
+    if error:
+        raise error[0]
+
+
+def _timed_send(send, batch):
+    start = time.perf_counter()
+    success, error = send(batch)
+    return success, error, time.perf_counter() - start
+
+
+def upload_batches(batches, send, concurrency=4, sizer=None, start=1):
+    """Send batches with at most `concurrency` requests in flight
+
+    send(batch) must return (success, error). Results are yielded as
+    BatchResult in the original batch order, so progress output and
+    per-record retries stay deterministic while later batches keep uploading.
+    Each result is fed back to `sizer` (a BatchSizer) when one is given.
+    Batches are numbered from `start` (the batch after a resumed checkpoint).
+    """
+    def finish(batch_num, batch, future):
+        result = BatchResult(batch_num, batch, *future.result())
+        if sizer is not None:
+            sizer.record(len(batch), result.elapsed, result.success, result.error)
+        return result
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        in_flight = deque()
+        for batch_num, batch in enumerate(batches, start):
+            in_flight.append((batch_num, batch, pool.submit(_timed_send, send, batch)))
+            if len(in_flight) >= concurrency:
+                yield finish(*in_flight.popleft())
+        while in_flight:
+            yield finish(*in_flight.popleft())
+
+
+def send_with_retries(send, batch, error=None, transient=is_transient_error, delays=None):
+    """Send batch, resending it after each of `delays` while it fails transiently
+
+    `error` is the failure already seen for this batch (None means it has
+    to be sent first). transient(error) tells failures worth resending from
+    those caused by the rows; None treats every failure as a data error.
+    Returns (success, error, requests). Raises TransientError when the
+    batch still fails transiently after the last delay (RETRY_DELAYS by
+    default), since that failure says nothing about the rows, and
+    FatalError at once on a failure no batch can get past (is_fatal_error).
+    """
+    requests = 0
+    if error is None:
+        requests += 1
+        success, error = send(batch)
+        if success:
+            return True, None, requests
+    for delay in RETRY_DELAYS if delays is None else delays:
+        if is_fatal_error(error):
+            raise FatalError(error)
+        if transient is None or not transient(error):
+            return False, error, requests
+        time.sleep(delay)
+        requests += 1
+        success, error = send(batch)
+        if success:
+            return True, None, requests
+    if is_fatal_error(error):
+        raise FatalError(error)
+    if transient is not None and transient(error):
+        raise TransientError(error)
+    return False, error, requests
+
+
+def bisect_batch(batch, send, error=None, transient=is_transient_error, delays=None):
+    """Split a failed batch recursively to isolate the rows that make it fail
+
+    `error` is the failure already seen for exactly this batch (None means it
+    has to be sent first). PostgREST inserts a batch atomically, so when the
+    first half goes through after a data error the second half is known to
+    fail and is split without being re-sent. Isolating one bad row in a batch
+    of n costs about log2(n) requests instead of n.
+
+    Timeouts, 5xx, 408 and 429 are not split: every request is resent as is
+    (see send_with_retries), and TransientError is raised when one keeps
+    failing, so an unavailable server never turns rows into rejects. Nor
+    are 401, 403, 404 and the other statuses that don't depend on the rows:
+    they raise FatalError on the first request.
+
+    Returns (inserted, rejects, requests) where rejects is a list of
+    (record, error) pairs.
+    """
+    success, error, requests = send_with_retries(send, batch, error, transient, delays)
+    if success:
+        return len(batch), [], requests
+    if len(batch) == 1:
+        return 0, [(batch[0], error)], requests
+
+    mid = len(batch) // 2
+    first, second = batch[:mid], batch[mid:]
+    success, first_error, first_requests = send_with_retries(send, first, None, transient, delays)
+    requests += first_requests
+    if success:
+        inserted, rejects = len(first), []
+        known_error = None if is_overload_error(error) else error  # a 413 may not apply to a half
+        second_result = bisect_batch(second, send, known_error, transient, delays)
+    else:
+        inserted, rejects, first_requests = bisect_batch(first, send, first_error, transient, delays)
+        requests += first_requests
+        second_result = bisect_batch(second, send, None, transient, delays)
+
+    inserted += second_result[0]
+    rejects += second_result[1]
+    requests += second_result[2]
+    return inserted, rejects, requests
+
+
+def write_rejects(f, rejects):
+    """Append rejected records and their error text to a dead-letter file as JSON lines"""
+    for record, error in rejects:
+        f.write(json.dumps({'error': error, 'record': record}) + '\n')
+
+
+class CheckpointJournal:
+    """Append-only JSON-lines journal of committed batches
+
+    One line per batch, written only after the batch (and everything before
+    it) is in the target: table, batch number, the dump position behind its
+    last row and its id range. A restarted import seeks straight to the last
+    position of its table instead of re-reading and re-sending the dump.
+
+    Entries carry the identity of the dump (`source`, by default its size
+    and mtime, see sql_dump.dump_source); those of a dump that has since
+    been regenerated are ignored, as their offsets point into another file.
+    A dump read from stdin has no identity and is neither journaled nor
+    resumed: a piped run always starts at the beginning.
+    """
+
+    def __init__(self, path, dump_path, source=None):
+        self.path = path
+        self.dump_path = os.path.abspath(dump_path)
+        self.source = dump_source(dump_path) if source is None else source
+        self._file = None
+
+    def last(self, table):
+        """Latest checkpoint of table for this version of the dump, or None"""
+        if self.source is None:
+            print(f"Reading {table} from stdin: no checkpoints, an interrupted run starts over")
+            return None
+        entry = None
+        stale = 0
+        try:
+            with open(self.path) as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        break  # torn last line of a crashed run
+                    if record['table'] == table and record['dump'] == self.dump_path:
+                        if record.get('source') == self.source:
+                            entry = record
+                        else:
+                            stale += 1
+        except FileNotFoundError:
+            pass
+        if stale:
+            print(f"Ignoring {stale} {table} journal entries for an older version of {self.dump_path}")
+        return entry
+
+    def commit(self, table, batch_num, batch):
+        """Record that batch (a Batch with a checkpoint) is committed"""
+        if self.source is None:
+            return
+        if self._file is None:
+            self._file = open(self.path, 'a')
+        first, last = batch[0], batch[-1]
+        entry = dict(
+            batch.checkpoint or {},  # None when not read from a dump (e.g. a stage)
+            table=table,
+            dump=self.dump_path,
+            source=self.source,
+            batch=batch_num,
+            first_id=first.get('id') if isinstance(first, dict) else None,
+            last_id=last.get('id') if isinstance(last, dict) else None,
+            time=time.time(),
+        )
+        self._file.write(json.dumps(entry) + '\n')
+        self._file.flush()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def run_import(table, sql_file, build_record, send, journal_file, dead_letter_file, sizer=None,
+               concurrency=4, existing_ids=None, transform=None, parse_workers=1, progress_every=100):
+    """Stream the rows of table from a dump to send(batch), journaling every batch
+
+    Resumes behind the last journaled batch of table, drops records whose id
+    is in existing_ids (IdRanges) and passes the rest through
+    transform(records) if given (e.g. drop_orphans). Batches are sized by
+    `sizer` (a BatchSizer) and sent with `concurrency` in flight; failed
+    ones are bisected and their bad rows appended to the dead-letter file.
+    parse_workers > 1 parses the dump in that many processes.
+
+    A batch is journaled only once all its rows are inserted or rejected
+    for data reasons. The run stops at the first batch that keeps failing
+    transiently or fails for a reason unrelated to its rows (see
+    bisect_batch), so the next run resumes at that batch.
+
+    Returns an ImportResult.
+    """
+    sizer = sizer or BatchSizer()
+    inserted = 0
+    rejected = 0
+    bisect_requests = 0
+    bisect_rows = 0
+    stopped_at = None
+
+    # Continue behind the last committed batch of a previous run
+    journal = CheckpointJournal(journal_file, sql_file)
+    checkpoint = journal.last(table)
+    position = DumpPosition.resume(checkpoint)
+    start = 1
+    if checkpoint:
+        start = checkpoint['batch'] + 1
+        print(f"Resuming after batch {checkpoint['batch']} (last id {checkpoint['last_id']}, byte {checkpoint['offset']})")
+
+    print(f"\nStreaming {sql_file} starting at {sizer.size} rows per batch ({concurrency} in flight)...")
+    if parse_workers > 1:
+        from parallel_parse import parallel_parse_records  # imports this module
+        records = parallel_parse_records(sql_file, table, build_record, parse_workers, position)
+    else:
+        records = parse_records(read_lines(sql_file, position), table, build_record, position)
+    if existing_ids is not None:
+        records = skip_existing(records, existing_ids)
+    if transform is not None:
+        records = transform(records)
+    batches = prefetch(adaptive_batched(records, sizer, position))
+
+    with open(dead_letter_file, 'a') as dead_letter:
+        for batch_num, batch, success, error, _ in upload_batches(batches, send, concurrency, sizer, start):
+            if success:
+                inserted += len(batch)
+                if batch_num % progress_every == 0 or batch_num == 1:
+                    print(f"  Batch {batch_num}: OK ({inserted} total)")
+            else:
+                # Bisect the failed batch to isolate the bad rows
+                try:
+                    batch_inserted, rejects, requests = bisect_batch(batch, send, error)
+                except TransientError as e:
+                    print(f"  Batch {batch_num} still failing after {len(RETRY_DELAYS)} retries: {str(e)[:150]}")
+                    print("Stopping; the next run resumes at this batch")
+                    stopped_at = batch_num
+                    break
+                except FatalError as e:
+                    print(f"  Batch {batch_num} failed: {str(e)[:150]}")
+                    print("Stopping; fix the cause and rerun, the next run resumes at this batch")
+                    stopped_at = batch_num
+                    break
+                inserted += batch_inserted
+                bisect_requests += requests
+                bisect_rows += len(batch)
+                write_rejects(dead_letter, rejects)
+                for record, e in rejects:
+                    rejected += 1
+                    if rejected <= 20:
+                        print(f"    Record {record.get('id')} failed: {e[:150]}")
+            # Only reached once the batch went in or the server answered for its rows
+            # (400/409/413/422): transient and fatal failures stop the run above
+            journal.commit(table, batch_num, batch)
+    journal.close()
+
+    if bisect_rows:
+        print(f"Bisection isolated {rejected} bad rows from {bisect_rows} in {bisect_requests} requests "
+              f"(row-by-row would have taken {bisect_rows}), rejects written to {dead_letter_file}")
+    return ImportResult(inserted, rejected, stopped_at)
@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+"""
+Export every table from MySQL for Supabase in one run
+
+Small tables come from migrate_mysql_to_supabase.py, w_contacts and
+w_register from migrate_large_tables.py. Tables run concurrently in
+foreign-key order (see migration_graph.py): w_register only starts once
+branches, accounts, categories, contacts and services are done.
+"""
+
+import os
+import time
+from functools import partial
+
+import migrate_large_tables
+import migrate_mysql_to_supabase
+from migration_graph import print_timing_report, run_tables
+
+MAX_WORKERS = 4  # Tables exported at the same time
+
+def main():
+    print("=" * 60)
+    print("MySQL to Supabase export (all tables)")
+    print("=" * 60)
+
+    os.makedirs(migrate_mysql_to_supabase.OUTPUT_DIR, exist_ok=True)
+
+    tasks = {table: partial(migrate_mysql_to_supabase.generate_sql_file, table)
+             for table in migrate_mysql_to_supabase.MIGRATIONS}
+    tasks['w_contacts'] = migrate_large_tables.export_contacts
+    tasks['w_register'] = migrate_large_tables.export_register
+
+    start = time.time()
+    results = run_tables(tasks, migrate_mysql_to_supabase.table_dependencies(), MAX_WORKERS)
+    migrate_mysql_to_supabase.source.close()
+    migrate_large_tables.source.close()
+
+    print_timing_report(results, time.time() - start)
+
+if __name__ == "__main__":
+    main()
@@ -3,121 +3,147 @@
 Migrate large tables (contacts and register) from MySQL to Supabase
 """
 
-import subprocess
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from mysql_source import MySQLSource
+from sql_dump import open_dump, sql_literal
+from staging import StageWriter, open_stage
+from table_specs import CONTACTS, REGISTER
 
 # Configuration
-MYSQL_CMD = "docker exec wvdi-mysql-1 mysql -u root -pJTgjKtkl73iKFPC3nk4h wvdi_local -N -e"
-
-def run_mysql_query(query):
-    """Execute MySQL query and return results"""
-    cmd = f'{MYSQL_CMD} "{query}"'
-    result = subprocess.run(cmd, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-    if result.returncode != 0:
-        print(f"MySQL Error: {result.stderr.decode('utf-8', errors='replace')}")
-        return []
-    # Decode with error handling for non-UTF8 characters
-    output = result.stdout.decode('utf-8', errors='replace')
-    lines = output.strip().split('\n') if output.strip() else []
-    return lines
-
-def escape_sql_string(s):
-    """Escape string for SQL"""
-    if s is None or s == 'NULL':
-        return 'NULL'
-    s = str(s).replace("'", "''").replace("\\", "\\\\")
-    return f"'{s}'"
-
-def export_contacts_batch(offset, limit):
-    """Export a batch of contacts from MySQL"""
-    query = f"""
-    SELECT id, branch_id, contact_type, contact_status,
-           IFNULL(company,''), IFNULL(first_name,''), IFNULL(middle_name,''), last_name,
-           IFNULL(nick_name,''), IFNULL(email,''), IFNULL(gender,''), IFNULL(license_code,''),
-           IFNULL(referral_type,''), IFNULL(phone1,''), IFNULL(phone2,''),
-           IFNULL(address1,''), IFNULL(address2,''), IFNULL(region,''), IFNULL(city,''),
-           IFNULL(zip_code,''), IFNULL(photo,''), IFNULL(updated_by,'NULL'),
-           created_at, updated_at
-    FROM w_contacts ORDER BY id LIMIT {limit} OFFSET {offset}
-    """
-    return run_mysql_query(query)
-
-def export_register_batch(offset, limit):
-    """Export a batch of register entries from MySQL"""
-    query = f"""
-    SELECT id, branch_id, contact_id, IFNULL(account_id,'NULL'), IFNULL(service_id,'NULL'),
-           register_type, register_status, register_date, IFNULL(description,''),
-           IFNULL(received_by,'NULL'), IFNULL(cash,0), IFNULL(gcash,0), IFNULL(bank,0),
-           IFNULL(ar,0), IFNULL(refund,0), IFNULL(expense_category,'NULL'), IFNULL(notes,''),
-           created_at, updated_at, IFNULL(updated_by,'NULL')
-    FROM w_register ORDER BY id LIMIT {limit} OFFSET {offset}
-    """
-    return run_mysql_query(query)
+MYSQL_SOURCE = ("wvdi-mysql-1", "root", "JTgjKtkl73iKFPC3nk4h", "wvdi_local")  # container, user, password, database
 
-def main():
-    print("Starting large table migration...")
+EXPORT_SHARDS = 4  # Disjoint id ranges exported in parallel per table
 
-    # Count records
-    contacts_count = run_mysql_query("SELECT COUNT(*) FROM w_contacts")
-    register_count = run_mysql_query("SELECT COUNT(*) FROM w_register")
+EXPORT_DIR = '/Users/philippebarthelemy/dev/wvdi/wvdi/nextjs/scripts/migrations'
+EXPORT_SUFFIX = ''  # '.gz', '.xz', '.bz2' or '.zst' compresses the export files
+
+# Every extract is also kept in EXPORT_DIR/<table>.stage (see staging.py);
+# True rewrites the SQL files from there instead of querying MySQL again
+REUSE_STAGE = False
+
+# Shared by all threads; every export shard queries over its own session
+source = MySQLSource(*MYSQL_SOURCE)
+
+def run_mysql_query(query, types, source=source):
+    """Execute MySQL query and return its rows as typed tuples
+
+    Raises MySQLError, so a failed batch is never mistaken for the end of
+    an id range.
+    """
+    return list(source.rows(query, types))
 
-    print(f"Contacts to migrate: {contacts_count[0] if contacts_count else 0}")
-    print(f"Register entries to migrate: {register_count[0] if register_count else 0}")
+def export_batch(spec, last_id, max_id, limit):
+    """Export the next `limit` rows with last_id < id <= max_id
 
-    # Export contacts in batches
-    batch_size = 500
-    offset = 0
-    total_contacts = int(contacts_count[0]) if contacts_count else 0
+    Seeks on the primary key (keyset pagination), so every batch is an index
+    range scan; LIMIT/OFFSET made MySQL rescan all previous rows each time.
+    """
+    query = spec.select(f"WHERE id > {last_id} AND id <= {max_id} ORDER BY id LIMIT {limit}")
+    return [spec.convert(row) for row in run_mysql_query(query, spec.types)]
 
-    print("\nExporting contacts...")
-    all_contacts = []
-    while offset < total_contacts:
-        batch = export_contacts_batch(offset, batch_size)
-        all_contacts.extend(batch)
-        offset += batch_size
-        print(f"  Exported {min(offset, total_contacts)}/{total_contacts} contacts")
+def id_shards(table, shards):
+    """Split the id span of table into `shards` disjoint (low, high] ranges"""
+    result = run_mysql_query(f"SELECT MIN(id), MAX(id) FROM {table}", (int, int))
+    if not result or result[0][0] is None:
+        return []
+    min_id, max_id = result[0]
+    step = -(-(max_id - min_id + 1) // shards)
+    low = min_id - 1
+    return [(low + i * step, min(low + (i + 1) * step, max_id))
+            for i in range(shards) if low + i * step < max_id]
+
+def export_shard(spec, low, high, batch_size):
+    """Export every row of one id range in batches; return the typed rows"""
+    start = time.time()
+    rows = []
+    last_id = low
+    while True:
+        batch = export_batch(spec, last_id, high, batch_size)
+        if not batch:
+            break
+        rows.extend(batch)
+        last_id = batch[-1][0]
+        if len(batch) < batch_size:
+            break
+    elapsed = time.time() - start
+    print(f"  {spec.table} ids ({low}, {high}]: {len(rows)} rows in {elapsed:.1f}s "
+          f"({len(rows) / elapsed if elapsed else 0:.0f} rows/s)")
+    return rows
+
+def export_table(spec, batch_size, shards=EXPORT_SHARDS):
+    """Yield every row of a table in id order, walking its id shards in parallel
+
+    Each shard's rows are yielded as soon as it and the shards before it
+    are done, and dropped once consumed, so the table is never held whole.
+    """
+    ranges = id_shards(spec.table, shards)
+    with ThreadPoolExecutor(max_workers=max(1, len(ranges))) as pool:
+        for rows in pool.map(lambda r: export_shard(spec, r[0], r[1], batch_size), ranges):
+            yield from rows
+
+BATCH_SIZE = 500
+
+def extract_table(spec):
+    """Stage of spec's table: the previous extract with REUSE_STAGE, else a fresh one"""
+    path = os.path.join(EXPORT_DIR, f'{spec.table}.stage')
+    stage = open_stage(path) if REUSE_STAGE else None
+    if stage is not None:
+        print(f"\nUsing {stage.rows_count} staged {spec.table} rows from {path}")
+        return stage
+
+    print(f"\nExporting {spec.table} ({EXPORT_SHARDS} shards)...")
+    start = time.time()
+    writer = StageWriter(path, spec.table, [c.name for c in spec.columns], source='mysql')
+    for row in export_table(spec, BATCH_SIZE):
+        writer.write(row)
+    stage = writer.close()
+    print(f"  Exported {stage.rows_count} {spec.table} rows in {time.time() - start:.1f}s")
+    return stage
+
+def export_contacts():
+    """Export w_contacts to contacts_import.sql"""
+    all_contacts = extract_table(CONTACTS)
 
     # Write to SQL file for import
-    with open('/Users/philippebarthelemy/dev/wvdi/wvdi/nextjs/scripts/migrations/contacts_import.sql', 'w') as f:
+    with open_dump(os.path.join(EXPORT_DIR, 'contacts_import.sql' + EXPORT_SUFFIX), 'w') as f:
         f.write("-- Contacts data for Supabase import\n")
         f.write("DELETE FROM w_register;\n")  # Clear register first due to FK
         f.write("DELETE FROM w_contacts;\n\n")
 
-        for i, line in enumerate(all_contacts):
-            if not line.strip():
-                continue
-            fields = line.split('\t')
-            if len(fields) >= 24:
-                sql = f"""INSERT INTO w_contacts (id, branch_id, contact_type, contact_status, company, first_name, middle_name, last_name, nick_name, email, gender, license_code, referral_type, phone1, phone2, address1, address2, region, city, zip_code, photo, updated_by, created_at, updated_at) VALUES ({fields[0]}, {fields[1]}, {escape_sql_string(fields[2])}, {escape_sql_string(fields[3])}, {escape_sql_string(fields[4])}, {escape_sql_string(fields[5])}, {escape_sql_string(fields[6])}, {escape_sql_string(fields[7])}, {escape_sql_string(fields[8])}, {escape_sql_string(fields[9])}, {escape_sql_string(fields[10])}, {escape_sql_string(fields[11])}, {escape_sql_string(fields[12])}, {escape_sql_string(fields[13])}, {escape_sql_string(fields[14])}, {escape_sql_string(fields[15])}, {escape_sql_string(fields[16])}, {escape_sql_string(fields[17])}, {escape_sql_string(fields[18])}, {escape_sql_string(fields[19])}, {escape_sql_string(fields[20])}, {fields[21] if fields[21] != 'NULL' else 'NULL'}, {escape_sql_string(fields[22])}, {escape_sql_string(fields[23])});\n"""
-                f.write(sql)
+        for row in all_contacts.rows():
+            f.write(f"INSERT INTO w_contacts ({CONTACTS.column_list}) VALUES ({', '.join(sql_literal(v) for v in row)});\n")
 
-    print(f"Wrote {len(all_contacts)} contacts to contacts_import.sql")
+    print(f"Wrote {all_contacts.rows_count} contacts to contacts_import.sql{EXPORT_SUFFIX}")
 
-    # Export register in batches
-    total_register = int(register_count[0]) if register_count else 0
-    offset = 0
-
-    print("\nExporting register entries...")
-    all_register = []
-    while offset < total_register:
-        batch = export_register_batch(offset, batch_size)
-        all_register.extend(batch)
-        offset += batch_size
-        print(f"  Exported {min(offset, total_register)}/{total_register} register entries")
+def export_register():
+    """Export w_register to register_import.sql"""
+    all_register = extract_table(REGISTER)
 
     # Write to SQL file
-    with open('/Users/philippebarthelemy/dev/wvdi/wvdi/nextjs/scripts/migrations/register_import.sql', 'w') as f:
+    with open_dump(os.path.join(EXPORT_DIR, 'register_import.sql' + EXPORT_SUFFIX), 'w') as f:
         f.write("-- Register data for Supabase import\n\n")
 
-        for i, line in enumerate(all_register):
-            if not line.strip():
-                continue
-            fields = line.split('\t')
-            if len(fields) >= 20:
-                sql = f"""INSERT INTO w_register (id, branch_id, contact_id, account_id, service_id, register_type, register_status, register_date, description, received_by, cash, gcash, bank, ar, refund, expense_category, notes, created_at, updated_at, updated_by) VALUES ({fields[0]}, {fields[1]}, {fields[2]}, {fields[3] if fields[3] != 'NULL' else 'NULL'}, {fields[4] if fields[4] != 'NULL' else 'NULL'}, {escape_sql_string(fields[5])}, {escape_sql_string(fields[6])}, {escape_sql_string(fields[7])}, {escape_sql_string(fields[8])}, {fields[9] if fields[9] != 'NULL' else 'NULL'}, {fields[10]}, {fields[11]}, {fields[12]}, {fields[13]}, {fields[14]}, {fields[15] if fields[15] != 'NULL' else 'NULL'}, {escape_sql_string(fields[16])}, {escape_sql_string(fields[17])}, {escape_sql_string(fields[18])}, {fields[19] if fields[19] != 'NULL' else 'NULL'});\n"""
-                f.write(sql)
+        for row in all_register.rows():
+            f.write(f"INSERT INTO w_register ({REGISTER.column_list}) VALUES ({', '.join(sql_literal(v) for v in row)});\n")
+
+    print(f"Wrote {all_register.rows_count} register entries to register_import.sql{EXPORT_SUFFIX}")
+
+def main():
+    print("Starting large table migration...")
+
+    # Count records (the staged extracts report their own counts)
+    if not REUSE_STAGE:
+        contacts_count = run_mysql_query("SELECT COUNT(*) FROM w_contacts", (int,))
+        register_count = run_mysql_query("SELECT COUNT(*) FROM w_register", (int,))
+
+        print(f"Contacts to migrate: {contacts_count[0][0] if contacts_count else 0}")
+        print(f"Register entries to migrate: {register_count[0][0] if register_count else 0}")
 
-    print(f"Wrote {len(all_register)} register entries to register_import.sql")
+    export_contacts()
+    export_register()
+    source.close()
     print("\nExport complete! Use Supabase SQL editor to import the files.")
 
 if __name__ == "__main__":
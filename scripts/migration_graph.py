@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Run per-table migration steps concurrently in foreign-key order
+
+The dependency graph comes from the REFERENCES clauses of the Supabase
+schema: a table starts as soon as every table it references has finished,
+so independent tables (e.g. contacts and services, both only needing
+branches) run side by side and only their dependents wait.
+"""
+
+import os
+import re
+import time
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+SCHEMA_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                           '..', 'supabase', 'migrations', '00001_initial_schema.sql')
+
+_CREATE_TABLE_RE = re.compile(r'CREATE\s+TABLE\s+(?:IF\s+NOT\s+EXISTS\s+)?(\w+)\s*\((.*?)\n\);', re.I | re.S)
+_REFERENCES_RE = re.compile(r'REFERENCES\s+(\w+)', re.I)
+_FK_COLUMN_RE = re.compile(r'^\s*(\w+)\s[^,\n]*?REFERENCES\s+(\w+)', re.I | re.M)
+
+# Outcome of one table: status is 'ok', 'failed' or 'skipped' (a parent failed);
+# start is seconds after the run began, so waiting on parents shows up there
+TableRun = namedtuple('TableRun', 'table status start elapsed error')
+
+
+def _read_tables(schema_file):
+    with open(schema_file) as f:
+        return _CREATE_TABLE_RE.findall(f.read())
+
+
+def load_fk_graph(schema_file=SCHEMA_FILE):
+    """Map each table of the schema to the set of tables it references"""
+    return {
+        table: set(_REFERENCES_RE.findall(body)) - {table}
+        for table, body in _read_tables(schema_file)
+    }
+
+
+def load_foreign_keys(table, schema_file=SCHEMA_FILE):
+    """Map each foreign key column of table to the table it references"""
+    for name, body in _read_tables(schema_file):
+        if name == table:
+            return dict(_FK_COLUMN_RE.findall(body))
+    return {}
+
+
+def _timed(task):
+    start = time.time()
+    task()
+    return time.time() - start
+
+
+def run_tables(tasks, dependencies, max_workers=4):
+    """Run tasks[table]() with up to max_workers at once, parents first
+
+    dependencies maps a table to the tables it needs; tables without a task
+    are ignored. A failing task doesn't stop the others, but every table
+    depending on it is skipped. Returns a TableRun per table, in finish order.
+    """
+    pending = {table: set(dependencies.get(table, ())) & set(tasks) - {table} for table in tasks}
+    done = set()
+    failed = set()
+    results = []
+    began = time.time()
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        running = {}
+        while pending or running:
+            changed = True
+            while changed:
+                changed = False
+                for table, parents in list(pending.items()):
+                    if parents & failed:
+                        del pending[table]
+                        failed.add(table)
+                        results.append(TableRun(table, 'skipped', None, None,
+                                                'needs ' + ', '.join(sorted(parents & failed))))
+                        changed = True
+                    elif parents <= done:
+                        del pending[table]
+                        running[pool.submit(_timed, tasks[table])] = (table, time.time() - began)
+
+            if not running:
+                if pending:
+                    raise ValueError(f"Dependency cycle between {', '.join(sorted(pending))}")
+                break
+
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                table, start = running.pop(future)
+                try:
+                    elapsed = future.result()
+                except Exception as e:
+                    failed.add(table)
+                    results.append(TableRun(table, 'failed', start, time.time() - began - start, str(e)))
+                    print(f"  {table} FAILED: {e}")
+                else:
+                    done.add(table)
+                    results.append(TableRun(table, 'ok', start, elapsed, None))
+
+    return results
+
+
+def print_timing_report(results, wall_time):
+    """Print when each table started, how long it took, and the overall speedup"""
+    print(f"\n{'Table':<24} {'Status':<8} {'Start':>8} {'Time':>8}")
+    for run in sorted(results, key=lambda r: (r.start is None, r.start or 0)):
+        start = f"{run.start:.1f}s" if run.start is not None else '-'
+        elapsed = f"{run.elapsed:.1f}s" if run.elapsed is not None else '-'
+        note = f"  ({run.error})" if run.error else ''
+        print(f"{run.table:<24} {run.status:<8} {start:>8} {elapsed:>8}{note}")
+    serial = sum(run.elapsed or 0 for run in results)
+    print(f"Wall time {wall_time:.1f}s, {serial:.1f}s if run one table at a time")
@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+Source reader for the Laravel MySQL database running in docker
+
+Keeps `mysql --batch --quick --unbuffered` clients open for the whole
+migration and feeds them queries on stdin, instead of paying `docker exec`
+startup and login for every query. Rows are streamed back as mysql prints
+them (--quick skips client-side buffering, --unbuffered flushes the result
+of every statement into the pipe). If a long-lived client can't be started,
+each query falls back to its own `docker exec ... mysql -e`.
+"""
+
+import os
+import re
+import subprocess
+import tempfile
+import threading
+
+# Printed after every query so the end of its result can be found in the stream
+_END_MARKER = '__end_of_result__'
+
+# How mysql --batch prints NULL (and how SELECT ... INTO OUTFILE does). A text
+# value that is literally 'NULL' is indistinguishable from it in batch output.
+NULL_FIELDS = frozenset(['NULL', '\\N'])
+
+# Backslash escapes mysql --batch uses inside a field
+_TSV_ESCAPE_RE = re.compile(r'\\(.)')
+_TSV_ESCAPES = {'0': '\0', 't': '\t', 'n': '\n', 'r': '\r', 'b': '\b', 'Z': '\x1a'}
+
+
+class MySQLError(Exception):
+    """Query failed or the mysql client went away"""
+
+
+def _unescape_match(match):
+    char = match.group(1)
+    return _TSV_ESCAPES.get(char, char)
+
+
+def unescape_field(field):
+    """Decode the \\t, \\n, \\0 and \\\\ escapes of one mysql --batch field"""
+    if '\\' not in field:
+        return field
+    return _TSV_ESCAPE_RE.sub(_unescape_match, field)
+
+
+def decode_row(line, types):
+    """Decode one mysql --batch line into a tuple typed by `types`
+
+    `types` has one converter per column (int, Decimal, str, ...); NULL
+    fields become None whatever the column type.
+    """
+    fields = line.split('\t')
+    if len(fields) != len(types):
+        raise MySQLError(f"Expected {len(types)} fields, got {len(fields)}: {line[:100]!r}")
+    return tuple([
+        None if field in NULL_FIELDS else convert(unescape_field(field))
+        for convert, field in zip(types, fields)
+    ])
+
+
+def iter_rows(lines, types):
+    """Decode a stream of mysql --batch lines row by row"""
+    for line in lines:
+        yield decode_row(line, types)
+
+
+def _mysql_command(container, user, password, database, *args):
+    return ['docker', 'exec', '-i', container, 'mysql', f'-u{user}', f'-p{password}', database,
+            '--batch', '--quick', '--skip-column-names', *args]
+
+
+class MySQLSession:
+    """One long-lived mysql client process that runs queries one at a time
+
+    stderr goes to a temporary file: mysql writes an error there before it
+    runs the next statement (the end marker), so once the marker is read the
+    error text is already in the file.
+    """
+
+    def __init__(self, container, user, password, database):
+        self._stderr = tempfile.TemporaryFile()
+        self.proc = subprocess.Popen(
+            _mysql_command(container, user, password, database, '--force', '--unbuffered'),
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=self._stderr
+        )
+
+    def _stderr_size(self):
+        return os.fstat(self._stderr.fileno()).st_size
+
+    def _error_since(self, offset):
+        """Last line mysql wrote to stderr after `offset`"""
+        fd = self._stderr.fileno()
+        data = os.pread(fd, self._stderr_size() - offset, offset)  # leaves the shared file offset alone
+        lines = [line.strip() for line in data.decode('utf-8', errors='replace').splitlines()
+                 if line.strip() and 'Using a password' not in line]
+        return lines[-1] if lines else 'unknown error'
+
+    def _exited(self, offset):
+        self.proc.wait()
+        return MySQLError(f"mysql client exited: {self._error_since(offset)}")
+
+    def query(self, sql):
+        """Yield the raw tab separated lines of one query's result"""
+        statement = sql.strip().rstrip(';')
+        errors = self._stderr_size()
+        try:
+            self.proc.stdin.write(f"{statement};\nSELECT '{_END_MARKER}', @@error_count;\n".encode('utf-8'))
+            self.proc.stdin.flush()
+        except (BrokenPipeError, OSError):
+            raise self._exited(errors)
+
+        finished = False
+        try:
+            for raw in self.proc.stdout:
+                line = raw.decode('utf-8', errors='replace').rstrip('\n')
+                if line.startswith(_END_MARKER + '\t'):
+                    finished = True
+                    if line != _END_MARKER + '\t0':
+                        raise MySQLError(self._error_since(errors))
+                    return
+                yield line
+            finished = True
+            raise self._exited(errors)
+        finally:
+            if not finished:
+                # Result abandoned half-way: skip the rest so the next query starts clean
+                for raw in self.proc.stdout:
+                    if raw.startswith(_END_MARKER.encode() + b'\t'):
+                        break
+
+    def close(self):
+        if self.proc.poll() is None:
+            self.proc.stdin.close()
+            self.proc.wait()
+        self._stderr.close()
+
+
+class MySQLSource:
+    """Streams query results from MySQL over a pool of sessions
+
+    A session runs one query at a time, so a query takes an idle session or
+    opens a new one and hands it back once its result is read. However many
+    threads come and go (each export_table starts its own), only as many
+    sessions are ever open as queries ran at the same time.
+    """
+
+    def __init__(self, container, user, password, database, persistent=True):
+        self.args = (container, user, password, database)
+        self.persistent = persistent
+        self._idle = []
+        self._sessions = []
+        self._lock = threading.Lock()
+        self.queries = 0
+
+    def _acquire(self):
+        """An idle or new session, or None to use docker exec per query"""
+        with self._lock:
+            if self._idle:
+                return self._idle.pop()
+        if not self.persistent:
+            return None
+        try:
+            session = MySQLSession(*self.args)
+            list(session.query('SELECT 1'))
+        except (OSError, MySQLError) as e:
+            print(f"Persistent mysql session unavailable ({e}), using docker exec per query")
+            self.persistent = False
+            return None
+        with self._lock:
+            self._sessions.append(session)
+        return session
+
+    def _release(self, session):
+        with self._lock:
+            if session.proc.poll() is None and session in self._sessions:
+                self._idle.append(session)
+                return
+            if session in self._sessions:
+                self._sessions.remove(session)
+        session.close()
+
+    def _query_once(self, sql):
+        proc = subprocess.Popen(_mysql_command(*self.args, '-e', sql),
+                                stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        for raw in proc.stdout:
+            yield raw.decode('utf-8', errors='replace').rstrip('\n')
+        if proc.wait() != 0:
+            raise MySQLError(proc.stderr.read().decode('utf-8', errors='replace').strip())
+
+    def query(self, sql):
+        """Yield the raw tab separated result lines of sql (mysql -N --batch format)"""
+        with self._lock:
+            self.queries += 1
+        session = self._acquire()
+        if session is None:
+            yield from self._query_once(sql)
+            return
+        try:
+            yield from session.query(sql)
+        finally:
+            self._release(session)
+
+    def rows(self, sql, types):
+        """Yield the rows of sql as typed tuples (see decode_row)"""
+        return iter_rows(self.query(sql), types)
+
+    def close(self):
+        """Close all sessions"""
+        with self._lock:
+            sessions, self._sessions, self._idle = self._sessions, [], []
+        for session in sessions:
+            session.close()
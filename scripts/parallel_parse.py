@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Parse a dump in several processes
+
+The file is cut into byte-range shards that each start at an INSERT line,
+so every shard parses on its own; CREATE TABLE column lists are collected
+up front for dumps without --complete-insert. Shards are parsed in a
+process pool and their rows handed back in file order (the exports are
+written in id order), with the same DumpPosition bookkeeping as
+read_lines + parse_records, so journal checkpoints and resume work the
+same in both modes. Record building (and its rule counters) stays in this
+process; only the tokenizing runs in the workers.
+"""
+
+import mmap
+import os
+import re
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from import_pipeline import DumpPosition, parse_records, read_lines
+from sql_dump import DumpState, is_stream, iter_dump_rows
+
+SHARD_BYTES = 4 * 1024 * 1024  # Dump bytes parsed per task
+
+_CREATE_TABLE_RE = re.compile(rb'^CREATE TABLE', re.M)
+
+
+def table_definitions(path):
+    """Column lists of every CREATE TABLE in the dump, by table name"""
+    state = DumpState()
+    if not os.path.getsize(path):
+        return state.table_columns
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        for m in _CREATE_TABLE_RE.finditer(data):
+            end = data.find(b'\n)', m.start())
+            block = data[m.start():end + 3 if end >= 0 else len(data)].decode('utf-8')
+            for _ in iter_dump_rows(block.splitlines(True), None, state):
+                pass
+    return state.table_columns
+
+
+def shard_offsets(path, start=0, shard_bytes=SHARD_BYTES):
+    """Offsets cutting the file from `start` into shards of about shard_bytes
+
+    Every offset but the first and the last (the file size) is the start of
+    an INSERT line, so no statement is split between two shards.
+    """
+    size = os.path.getsize(path)
+    offsets = [start]
+    with open(path, 'rb') as f:
+        target = start + shard_bytes
+        while target < size:
+            f.seek(target)
+            offset = target + len(f.readline())  # finish the line we landed in
+            for line in iter(f.readline, b''):
+                if line.startswith(b'INSERT INTO'):
+                    break
+                offset += len(line)
+            if offset >= size:
+                break
+            offsets.append(offset)
+            target = offset + shard_bytes
+    offsets.append(size)
+    return offsets
+
+
+def parse_shard(path, start, end, table, state):
+    """Rows of `table` in path[start:end] as (offset, pending, columns, rows) per line
+
+    `pending` is the parser state at the start of the line, which is what a
+    DumpPosition checkpoint taken inside that line has to record.
+    """
+    entries = []
+    line = [None, None]
+
+    def lines():
+        with open(path, 'rb') as f:
+            f.seek(start)
+            offset = start
+            while offset < end:
+                text = f.readline()
+                if not text:
+                    break
+                line[:] = offset, state.pending
+                offset += len(text)
+                yield text.decode('utf-8')
+
+    known = {}
+    entry = None
+    for columns, values in iter_dump_rows(lines(), table, state):
+        if entry is None or entry[0] != line[0]:
+            entry = (line[0], line[1], known.setdefault(columns, columns), [])
+            entries.append(entry)
+        entry[3].append(values)
+    return entries
+
+
+def parallel_parse_records(path, table, build_record, workers=4, position=None, shard_bytes=SHARD_BYTES):
+    """parse_records(read_lines(path, position), ...) with the parsing spread over processes
+
+    At most 2 * workers shards are parsed ahead of the consumer, so memory
+    stays bounded however slowly the records are uploaded. Compressed dumps
+    and stdin can't be split and are parsed in this process.
+    """
+    if position is None:
+        position = DumpPosition()
+    if is_stream(path):
+        yield from parse_records(read_lines(path, position), table, build_record, position)
+        return
+    state = position.state
+    state.table_columns = {**table_definitions(path), **state.table_columns}
+    offsets = shard_offsets(path, position.offset, shard_bytes)
+    tasks = [
+        (path, start, end, table, DumpState(state.table_columns, state.pending if i == 0 else None))
+        for i, (start, end) in enumerate(zip(offsets, offsets[1:]))
+    ]
+    resume_offset, skip = position.offset, position.rows
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        in_flight = deque()
+        tasks = iter(tasks)
+        for task in tasks:
+            in_flight.append(pool.submit(parse_shard, *task))
+            if len(in_flight) >= 2 * workers:
+                break
+        while in_flight:
+            entries = in_flight.popleft().result()
+            for task in tasks:
+                in_flight.append(pool.submit(parse_shard, *task))
+                break
+            for offset, pending, columns, rows in entries:
+                position.offset = offset
+                position.rows = 0
+                state.pending = pending
+                for values in rows:
+                    position.rows += 1
+                    if offset == resume_offset and position.rows <= skip:
+                        continue
+                    yield build_record(columns, values)
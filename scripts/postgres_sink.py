@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Postgres sinks for the import pipeline: COPY and multi-row INSERT
+
+COPY ... FROM STDIN loads a whole batch in one statement: no per-row parse,
+plan or round trip, unlike executing one INSERT per row. Rows are rendered
+to CSV lazily while psycopg2 reads the stream, so a batch is never held as
+one big string. insert_rows is the INSERT fallback (e.g. for poolers or
+targets that refuse COPY): typed values are passed as parameters, so there
+is no hand-written escaping.
+"""
+
+from operator import itemgetter
+
+try:
+    from psycopg2.extras import execute_values
+except ImportError:  # only insert_rows needs it
+    execute_values = None
+
+
+def quote_ident(name):
+    """Quote a table or column name (w_register has a column named "check")"""
+    return '"' + name.replace('"', '""') + '"'
+
+
+def csv_field(value):
+    """Render one value for COPY ... (FORMAT csv)
+
+    Strings are always quoted so that '' stays an empty string; an unquoted
+    empty field is NULL.
+    """
+    if value is None:
+        return ''
+    if isinstance(value, str):
+        return '"' + value.replace('"', '""') + '"'
+    return str(value)
+
+
+class CsvStream:
+    """Read-only file object producing CSV lines for rows on demand"""
+
+    def __init__(self, rows):
+        self._rows = iter(rows)
+        self._buffer = b''
+        self.rows = 0
+
+    def read(self, size=-1):
+        chunks = [self._buffer]
+        length = len(self._buffer)
+        for row in self._rows:
+            line = (','.join([csv_field(v) for v in row]) + '\n').encode('utf-8')
+            chunks.append(line)
+            length += len(line)
+            self.rows += 1
+            if 0 <= size <= length:
+                break
+        data = b''.join(chunks)
+        if size < 0:
+            self._buffer = b''
+            return data
+        self._buffer = data[size:]
+        return data[:size]
+
+
+def copy_rows(conn, table, columns, rows, size=65536):
+    """COPY row tuples (in `columns` order) into table and commit; return the row count
+
+    Each call is its own transaction, so a failed batch leaves nothing behind
+    and every committed batch can be journaled.
+    """
+    stream = CsvStream(rows)
+    sql = (f"COPY {quote_ident(table)} ({', '.join(quote_ident(c) for c in columns)}) "
+           f"FROM STDIN WITH (FORMAT csv)")
+    try:
+        with conn.cursor() as cursor:
+            cursor.copy_expert(sql, stream, size)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return stream.rows
+
+
+def _row_getter(columns):
+    return itemgetter(*columns) if len(columns) > 1 else lambda r: (r[columns[0]],)
+
+
+def copy_records(conn, table, records):
+    """COPY a batch of record dicts that all have the same keys"""
+    columns = list(records[0])
+    return copy_rows(conn, table, columns, map(_row_getter(columns), records))
+
+
+def insert_rows(conn, table, columns, rows, page_size=500, on_conflict=None):
+    """INSERT row tuples with multi-row VALUES statements and commit; return the row count
+
+    execute_values sends page_size rows per statement, so Postgres parses
+    and plans once per page instead of once per row. on_conflict names the
+    unique column(s) on which rows already in the table are skipped
+    (ON CONFLICT ... DO NOTHING).
+    """
+    rows = list(rows)
+    sql = (f"INSERT INTO {quote_ident(table)} ({', '.join(quote_ident(c) for c in columns)}) "
+           f"VALUES %s")
+    if on_conflict:
+        sql += f" ON CONFLICT ({on_conflict}) DO NOTHING"
+    try:
+        with conn.cursor() as cursor:
+            execute_values(cursor, sql, rows, page_size=page_size)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return len(rows)
+
+
+def insert_records(conn, table, records, page_size=500, on_conflict=None):
+    """INSERT a batch of record dicts that all have the same keys"""
+    columns = list(records[0])
+    return insert_rows(conn, table, columns, map(_row_getter(columns), records), page_size, on_conflict)
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Declarative value fixups applied while building import records
+
+Each table declares its fixups once (0 -> NULL for optional foreign keys,
+branch 0 -> 1, enum normalization) and RecordRules compiles them, per
+column list of the dump, into one generated build_record function: the
+column positions are resolved up front, rules for columns the statement
+doesn't have are dropped (defaults add those columns instead), and the
+record dict is built from a literal instead of dict(zip()) plus a .get()
+per rule. Every rule counts the rows whose value it actually changed.
+"""
+
+
+class Rule:
+    """Rewrite one column value `v`
+
+    `prepare` (optional statement), `test` and `action` are Python source;
+    {name} placeholders refer to the objects passed as keyword arguments.
+    A `missing` rule applies instead to statements without the column: it
+    starts from v = None and adds the column to the record.
+    """
+
+    def __init__(self, column, label, test, action, prepare=None, missing=False, **names):
+        self.column = column
+        self.label = label
+        self.test = test
+        self.action = action
+        self.prepare = prepare
+        self.missing = missing
+        self.names = names
+
+
+def null_if(column, value=0):
+    """Store NULL instead of `value` (e.g. 0 in a foreign key column)"""
+    return Rule(column, f"{column} {value!r} -> NULL", 'v == {value}', 'None', value=value)
+
+
+def replace(column, old, new):
+    """Store `new` instead of `old`"""
+    return Rule(column, f"{column} {old!r} -> {new!r}", 'v == {old}', '{new}', old=old, new=new)
+
+
+def normalize(column, func, label=None):
+    """Store func(v); rows count as touched when the result differs"""
+    return Rule(column, label or f"{column} {func.__name__}", 'n != v', 'n', 'n = {func}(v)', func=func)
+
+
+def map_values(column, mapping, other):
+    """Store mapping[v], or `other` for values (including NULL) not in mapping"""
+    return Rule(column, f"{column} mapped", 'n != v', 'n', 'n = {mapping}.get(v, {other})',
+                mapping=mapping, other=other)
+
+
+def default(column, value):
+    """Add the column as `value` when the dump's statement doesn't have it"""
+    return Rule(column, f"{column} missing -> {value!r}", 'v is None', '{value}', missing=True, value=value)
+
+
+class RecordRules:
+    """Compile rules into build_record(columns, values) -> record dict"""
+
+    def __init__(self, table, rules):
+        self.table = table
+        self.rules = rules
+        self.counts = [0] * len(rules)
+        self._compiled = {}
+        self._last = (None, None)
+
+    def build_record(self, columns, values):
+        last_columns, build = self._last
+        if columns is not last_columns:
+            build = self._compiled.get(columns)
+            if build is None:
+                build = self._compiled[columns] = self._compile(columns)
+            self._last = (columns, build)
+        return build(values)
+
+    def _compile(self, columns):
+        namespace = {'counts': self.counts}
+        lines = ['def build(values):']
+        values = [f'values[{i}]' for i in range(len(columns))]
+        added = {}
+        for r, rule in enumerate(self.rules):
+            if (rule.column in columns) == rule.missing:
+                continue
+            names = {name: f'r{r}_{name}' for name in rule.names}
+            for name, obj in rule.names.items():
+                namespace[names[name]] = obj
+            if rule.missing:
+                lines.append(f'    v = {added.get(rule.column, "None")}')
+            else:
+                i = columns.index(rule.column)
+                lines.append(f'    v = {values[i]}')
+            if rule.prepare:
+                lines.append('    ' + rule.prepare.format(**names))
+            lines.append(f'    if {rule.test.format(**names)}:')
+            lines.append(f'        counts[{r}] += 1')
+            lines.append(f'        v = {rule.action.format(**names)}')
+            if rule.missing:
+                lines.append(f'    m{r} = v')
+                added[rule.column] = f'm{r}'
+            else:
+                lines.append(f'    c{i} = v')
+                values[i] = f'c{i}'
+        items = list(zip(columns, values)) + list(added.items())
+        lines.append('    return {' + ', '.join(f'{c!r}: {v}' for c, v in items) + '}')
+        exec('\n'.join(lines) + '\n', namespace)
+        return namespace['build']
+
+    def report(self):
+        """Print how many rows each rule changed"""
+        print(f"Fixups applied to {self.table}:")
+        for rule, count in zip(self.rules, self.counts):
+            print(f"  {rule.label:<40} {count:>8,} rows")
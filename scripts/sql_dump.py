@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""
+Shared tokenizer for INSERT statements in MySQL/Postgres SQL dumps
+
+Values come out already typed: NULL -> None, integers -> int, decimals -> float,
+quoted strings -> str with '' and backslash escapes decoded.
+
+open_dump reads and writes dumps compressed according to their extension.
+"""
+
+import bz2
+import gzip
+import lzma
+import os
+import re
+import sys
+from functools import lru_cache
+
+try:
+    import zstandard
+except ImportError:  # only .zst files need it
+    zstandard = None
+
+def _open_zstd(path, mode, **kwargs):
+    if zstandard is None:
+        raise ImportError(f"{path}: pip3 install zstandard to read or write .zst files")
+    return zstandard.open(path, mode, **kwargs)
+
+
+# Compressed file extensions and how to open them (levels favour speed on multi-GB dumps)
+_COMPRESSION = {
+    '.gz': lambda path, mode, **kwargs: gzip.open(path, mode, compresslevel=6, **kwargs),
+    '.bz2': bz2.open,
+    '.xz': lzma.open,
+    '.zst': _open_zstd,
+}
+
+
+def compression_suffix(path):
+    """The compression extension of path ('.gz', '.bz2', '.xz', '.zst') or ''"""
+    for suffix in _COMPRESSION:
+        if path.endswith(suffix):
+            return suffix
+    return ''
+
+
+def is_stream(path):
+    """True for stdin ('-') and compressed files, which can only be read front to back"""
+    return path == '-' or bool(compression_suffix(path))
+
+
+def dump_source(path):
+    """Identity of a dump file (path, size, mtime), to tell when it was regenerated
+
+    None for stdin ('-'): one piped dump can't be told from the next.
+    """
+    if path == '-':
+        return None
+    stat = os.stat(path)
+    return {'dump': os.path.abspath(path), 'size': stat.st_size, 'mtime': stat.st_mtime}
+
+
+def open_dump(path, mode='r'):
+    """Open a dump or generated SQL file, (de)compressing by its extension
+
+    '-' is stdin for reading and stdout for writing, so exports can be piped.
+    Text modes use UTF-8.
+    """
+    binary = 'b' in mode
+    kwargs = {} if binary else {'encoding': 'utf-8'}
+    if path == '-':
+        fd = sys.stdin.fileno() if 'r' in mode else sys.stdout.fileno()
+        return open(fd, mode, closefd=False, **kwargs)
+    suffix = compression_suffix(path)
+    if not suffix:
+        return open(path, mode, **kwargs)
+    if not binary and 't' not in mode:
+        mode += 't'
+    return _COMPRESSION[suffix](path, mode, **kwargs)
+
+
+# Quoted literal, '' and backslash escapes allowed inside
+_STRING = r"'[^'\\]*(?:(?:\\.|'')[^'\\]*)*'"
+
+# INSERT INTO `table` (`col`, ...) VALUES  -- column list is optional
+_INSERT_RE = re.compile(
+    r'\s*INSERT\s+(?:IGNORE\s+)?INTO\s+[`"]?(\w+)[`"]?\s*(?:\(([^)]*)\)\s*)?VALUES\s*',
+    re.IGNORECASE
+)
+
+# CREATE TABLE `table` (  -- column definitions follow, one per line
+_CREATE_RE = re.compile(
+    r'\s*CREATE\s+TABLE\s+(?:IF\s+NOT\s+EXISTS\s+)?[`"]?(\w+)[`"]?\s*\(\s*$',
+    re.IGNORECASE
+)
+
+# Column definition line inside CREATE TABLE (key/constraint lines don't match)
+_COLUMN_DEF_RE = re.compile(
+    r'\s*(?:`(\w+)`|"(\w+)"|(?!(?:PRIMARY|KEY|UNIQUE|CONSTRAINT|INDEX|FOREIGN|FULLTEXT|SPATIAL|CHECK)\b)(\w+))\s',
+    re.IGNORECASE
+)
+
+# One parenthesised VALUES tuple (optionally after the ',' of an extended
+# INSERT), group 1 is the body between the parens. The body is an atomic
+# group: a tuple that doesn't close fails at once instead of backtracking
+# through every way of splitting it into runs and strings.
+_TUPLE_RE = re.compile(r"\s*,?\s*\(((?>(?:[^'()]+|" + _STRING + r")*))\)", re.DOTALL)
+
+# Start of a tuple, to tell an unclosed one from the end of the statement
+_TUPLE_START_RE = re.compile(r"\s*,?\s*\(")
+
+# One field of a tuple body: string (E'' prefix allowed) | NULL | integer | decimal | bare word
+_FIELD_RE = re.compile(
+    r"\s*(?:[Ee](?='))?(?:(" + _STRING + r")|(NULL)|([-+]?\d+)"
+    r"|([-+]?(?:\d+\.\d*|\.\d+|\d+)(?:[eE][-+]?\d+)?)|([^,']+?))\s*(?:,|\Z)",
+    re.DOTALL
+)
+
+_ESCAPE_RE = re.compile(r"\\(.)|''", re.DOTALL)
+
+# MySQL backslash escapes, anything else maps to the escaped character itself
+_ESCAPES = {'0': '\0', 'b': '\b', 'n': '\n', 'r': '\r', 't': '\t', 'Z': '\x1a'}
+
+
+def _unescape_match(match):
+    char = match.group(1)
+    if char is None:
+        return "'"
+    return _ESCAPES.get(char, char)
+
+
+def unescape_string(s):
+    """Decode '' and backslash escapes inside a quoted SQL literal"""
+    if '\\' not in s and "''" not in s:
+        return s
+    return _ESCAPE_RE.sub(_unescape_match, s)
+
+
+@lru_cache(maxsize=64)
+def parse_columns(columns_str):
+    """Split a column list, dropping backticks and double quotes"""
+    return tuple(c.strip().strip('`"') for c in columns_str.split(','))
+
+
+def parse_fields(body):
+    """Tokenize the body of a VALUES tuple into a tuple of typed values"""
+    return tuple([
+        unescape_string(s[1:-1]) if s else
+        None if null else
+        int(integer) if integer else
+        float(number) if number else
+        word
+        for s, null, integer, number, word in _FIELD_RE.findall(body)
+    ])
+
+
+def iter_tuples(text, pos=0):
+    """Yield the typed values of each consecutive tuple starting at text[pos]
+
+    Raises ValueError on a tuple that doesn't close on this line (a string
+    with a raw line break, a function call like NOW()).
+    """
+    match = _TUPLE_RE.match
+    while True:
+        m = match(text, pos)
+        if not m:
+            if _TUPLE_START_RE.match(text, pos):
+                raise ValueError(f"Unclosed VALUES tuple: {text[pos:pos + 80].strip()!r}")
+            return
+        yield parse_fields(m.group(1))
+        pos = m.end()
+
+
+class DumpState:
+    """Parser state carried from line to line by iter_dump_rows
+
+    Saving it alongside a byte offset lets parsing resume in the middle of a
+    dump (e.g. inside a multi-line INSERT of a dump without column lists).
+    """
+
+    def __init__(self, table_columns=None, pending=None):
+        self.table_columns = dict(table_columns or {})
+        self.pending = pending  # (wanted, columns) of an INSERT that continues on the next line
+
+
+def iter_dump_rows(lines, table=None, state=None):
+    """Yield (columns, values) for every row inserted into `table` in a dump
+
+    Handles mysqldump's extended inserts (many tuples per statement, or one
+    per line until the closing ';') and INSERTs without a column list, whose
+    column order is taken from the preceding CREATE TABLE.
+    """
+    if state is None:
+        state = DumpState()
+    table_columns = state.table_columns
+    creating = None   # table whose CREATE TABLE body is being read
+
+    for line in lines:
+        if creating is not None:
+            if line.lstrip().startswith(')'):
+                table_columns[creating] = tuple(table_columns[creating])
+                creating = None
+            else:
+                m = _COLUMN_DEF_RE.match(line)
+                if m:
+                    table_columns[creating].append(m.group(1) or m.group(2) or m.group(3))
+            continue
+
+        if state.pending is not None:
+            wanted, columns = state.pending
+            if wanted:
+                for values in iter_tuples(line):
+                    yield columns, values
+            if line.rstrip().endswith(';'):
+                state.pending = None
+            continue
+
+        m = _INSERT_RE.match(line)
+        if m:
+            name = m.group(1)
+            wanted = not table or name == table
+            columns = parse_columns(m.group(2)) if m.group(2) else table_columns.get(name)
+            if wanted:
+                if columns is None:
+                    raise ValueError(f"No column list for {name}: dump needs CREATE TABLE or --complete-insert")
+                for values in iter_tuples(line, m.end()):
+                    yield columns, values
+            if not line.rstrip().endswith(';'):
+                state.pending = (wanted, columns)
+            continue
+
+        m = _CREATE_RE.match(line)
+        if m:
+            creating = m.group(1)
+            table_columns[creating] = []
+
+
+def sql_literal(value):
+    """Format a typed value as a Postgres SQL literal (the reverse of parse_fields)
+
+    Text with backslashes or line breaks becomes an E'' string with escapes,
+    so every statement stays on one line of the output file.
+    """
+    if value is None:
+        return 'NULL'
+    if isinstance(value, str):
+        value = value.replace("'", "''")
+        if '\\' in value or '\n' in value or '\r' in value:
+            return "E'" + value.replace('\\', '\\\\').replace('\n', '\\n').replace('\r', '\\r') + "'"
+        return "'" + value + "'"
+    return str(value)
+
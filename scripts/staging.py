@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""
+Extract-once staging cache between the extract and load stages
+
+A stage is a directory of column-oriented chunk files plus a manifest.json
+listing the columns and, per chunk, its row count, min/max id and where
+each column lives in the file. Columns are stored typed: int and float
+columns as native arrays, text as one UTF-8 blob with offsets, Decimal as
+text, anything else (e.g. mixed types) pickled. Loading a chunk maps the
+file and turns each column into a list with a handful of C calls, so
+replaying a stage into a sink skips parsing the dump (or querying MySQL)
+entirely, and a reload of an id range only opens the chunks that overlap it.
+
+Usage: python scripts/staging.py dump.sql table   (stages into dump.sql.stage)
+"""
+
+import json
+import mmap
+import os
+import pickle
+import sys
+from array import array
+from decimal import Decimal
+
+from import_pipeline import read_lines
+from sql_dump import dump_source, iter_dump_rows
+
+CHUNK_ROWS = 50000  # Rows per chunk file
+_ALIGN = 8
+_INT64 = (-2 ** 63, 2 ** 63 - 1)
+
+
+def _column_kind(values):
+    kinds = {type(v) for v in values if v is not None}
+    if not kinds or kinds == {int}:
+        present = [v for v in values if v is not None]
+        if not present or _INT64[0] <= min(present) and max(present) <= _INT64[1]:
+            return 'int'
+    elif kinds == {float}:
+        return 'float'
+    elif kinds == {str}:
+        return 'str'
+    elif kinds == {Decimal}:
+        return 'decimal'
+    return 'pickle'
+
+
+def _encode_column(values):
+    """(kind, {segment: bytes}) for one column of a chunk"""
+    kind = _column_kind(values)
+    segments = {}
+    if kind == 'pickle':
+        segments['data'] = pickle.dumps(values, pickle.HIGHEST_PROTOCOL)
+        return kind, segments
+    if None in values:
+        segments['nulls'] = bytes([v is None for v in values])
+    if kind == 'int':
+        segments['data'] = array('q', [0 if v is None else v for v in values]).tobytes()
+    elif kind == 'float':
+        segments['data'] = array('d', [0.0 if v is None else v for v in values]).tobytes()
+    else:
+        texts = ['' if v is None else str(v) for v in values]
+        offsets = array('q', [0])
+        total = 0
+        for text in texts:
+            total += len(text)
+            offsets.append(total)
+        segments['offsets'] = offsets.tobytes()  # in characters, into the decoded blob
+        segments['data'] = ''.join(texts).encode('utf-8')
+    return kind, segments
+
+
+def _decode_column(kind, segments):
+    data = segments['data']
+    if kind == 'pickle':
+        return pickle.loads(data)
+    if kind == 'int':
+        values = data.cast('q').tolist()
+    elif kind == 'float':
+        values = data.cast('d').tolist()
+    else:
+        text = str(data, 'utf-8')
+        offsets = segments['offsets'].cast('q').tolist()
+        values = [text[start:end] for start, end in zip(offsets, offsets[1:])]
+        if kind == 'decimal':
+            values = [Decimal(v) if v else None for v in values]  # NULLs are stored as ''
+    nulls = segments.get('nulls')
+    if nulls is not None:
+        values = [None if null else v for v, null in zip(values, nulls)]
+    return values
+
+
+class StageWriter:
+    """Write rows (tuples in `columns` order) into a stage directory
+
+    The manifest is written by close(), so an interrupted write leaves no
+    usable stage behind and the next run simply stages again.
+    """
+
+    def __init__(self, path, table, columns, source=None, chunk_rows=CHUNK_ROWS):
+        self.path = path
+        self.columns = tuple(columns)
+        self.chunk_rows = chunk_rows
+        self.manifest = {'table': table, 'columns': list(self.columns), 'source': source, 'chunks': []}
+        self._id = self.columns.index('id') if 'id' in self.columns else None
+        self._rows = []
+        os.makedirs(path, exist_ok=True)
+        manifest = os.path.join(path, 'manifest.json')
+        if os.path.exists(manifest):
+            os.remove(manifest)
+
+    def write(self, row):
+        self._rows.append(row)
+        if len(self._rows) >= self.chunk_rows:
+            self._flush()
+
+    def _flush(self):
+        rows = self._rows
+        if not rows:
+            return
+        self._rows = []
+        filename = f"chunk-{len(self.manifest['chunks']):05d}.bin"
+        chunk = {'file': filename, 'rows': len(rows), 'min_id': None, 'max_id': None, 'columns': []}
+        if self._id is not None:
+            ids = [row[self._id] for row in rows if row[self._id] is not None]
+            if ids:
+                chunk['min_id'], chunk['max_id'] = min(ids), max(ids)
+
+        offset = 0
+        with open(os.path.join(self.path, filename), 'wb') as f:
+            for values in zip(*rows):
+                kind, segments = _encode_column(list(values))
+                layout = {'kind': kind}
+                for name, data in segments.items():
+                    layout[name] = [offset, len(data)]
+                    padding = -len(data) % _ALIGN
+                    f.write(data + b'\0' * padding)
+                    offset += len(data) + padding
+                chunk['columns'].append(layout)
+        self.manifest['chunks'].append(chunk)
+
+    def close(self):
+        self._flush()
+        manifest = os.path.join(self.path, 'manifest.json')
+        with open(manifest + '.tmp', 'w') as f:
+            json.dump(self.manifest, f)
+        os.replace(manifest + '.tmp', manifest)
+        return Stage(self.path)
+
+
+class Stage:
+    """A finished stage, read chunk by chunk through mmap"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, 'manifest.json')) as f:
+            self.manifest = json.load(f)
+        self.table = self.manifest['table']
+        self.columns = tuple(self.manifest['columns'])
+        self.chunks = self.manifest['chunks']
+        self.rows_count = sum(chunk['rows'] for chunk in self.chunks)
+
+    def read_chunk(self, chunk):
+        """The rows of one chunk as tuples"""
+        if not chunk['rows']:
+            return []
+        with open(os.path.join(self.path, chunk['file']), 'rb') as f:
+            data = memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+        columns = []
+        for layout in chunk['columns']:
+            segments = {name: data[span[0]:span[0] + span[1]]
+                        for name, span in layout.items() if name != 'kind'}
+            columns.append(_decode_column(layout['kind'], segments))
+        return list(zip(*columns))
+
+    def rows(self, min_id=None, max_id=None):
+        """Yield the staged rows, only those with min_id <= id <= max_id if given
+
+        Chunks whose id range doesn't overlap are never opened.
+        """
+        if min_id is None and max_id is None:
+            for chunk in self.chunks:
+                yield from self.read_chunk(chunk)
+            return
+        id_index = self.columns.index('id')
+        low = float('-inf') if min_id is None else min_id
+        high = float('inf') if max_id is None else max_id
+        for chunk in self.chunks:
+            if chunk['min_id'] is None or chunk['max_id'] < low or chunk['min_id'] > high:
+                continue
+            for row in self.read_chunk(chunk):
+                if row[id_index] is not None and low <= row[id_index] <= high:
+                    yield row
+
+    def records(self, build_record, min_id=None, max_id=None):
+        """Yield build_record(columns, values) for the staged rows (see rows)"""
+        columns = self.columns
+        for row in self.rows(min_id, max_id):
+            yield build_record(columns, row)
+
+
+def open_stage(path, source=None):
+    """The Stage at path, or None if there is none (or it was made from another source)"""
+    try:
+        stage = Stage(path)
+    except FileNotFoundError:
+        return None
+    if source is not None and stage.manifest['source'] != source:
+        return None
+    return stage
+
+
+def stage_dump(dump_path, table, stage_path=None, chunk_rows=CHUNK_ROWS):
+    """Stage the rows of `table` from a dump, reusing an up-to-date stage
+
+    The stage keeps the parsed values as they are in the dump; record
+    fixups are applied when it is replayed. Rows whose INSERT lists other
+    columns are rearranged to the columns of the first row.
+    """
+    stage_path = stage_path or dump_path + '.stage'
+    source = dump_source(dump_path)
+    stage = open_stage(stage_path, source) if source is not None else None  # stdin: always restage
+    if stage is not None:
+        return stage
+
+    writer = None
+    for columns, values in iter_dump_rows(read_lines(dump_path), table):
+        if writer is None:
+            writer = StageWriter(stage_path, table, columns, source, chunk_rows)
+        if columns != writer.columns:
+            by_name = dict(zip(columns, values))
+            extra = set(by_name) - set(writer.columns)
+            if extra:
+                raise ValueError(f"{table} row has columns missing from the stage: {', '.join(sorted(extra))}")
+            values = tuple(by_name.get(c) for c in writer.columns)
+        writer.write(values)
+    if writer is None:
+        writer = StageWriter(stage_path, table, (), source, chunk_rows)
+    return writer.close()
+
+
+def main():
+    if len(sys.argv) != 3:
+        print("Usage: python scripts/staging.py dump.sql table")
+        sys.exit(1)
+    dump_path, table = sys.argv[1], sys.argv[2]
+    stage = stage_dump(dump_path, table)
+    print(f"{stage.path}: {stage.rows_count:,} {table} rows in {len(stage.chunks)} chunks")
+
+
+if __name__ == "__main__":
+    main()
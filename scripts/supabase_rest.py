@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+Shared Supabase REST (PostgREST) client with a keep-alive connection pool
+
+urllib.request.urlopen opens a new TLS connection for every request; this
+client keeps up to pool_size idle HTTP/1.1 connections and hands them to
+whichever upload thread needs one next.
+"""
+
+import http.client
+import json
+import queue
+import threading
+import urllib.parse
+
+# Prefer header resolution for each upsert mode
+_RESOLUTIONS = {
+    'ignore': 'resolution=ignore-duplicates',   # INSERT ... ON CONFLICT DO NOTHING
+    'merge': 'resolution=merge-duplicates',     # INSERT ... ON CONFLICT DO UPDATE
+}
+
+# Errors raised when the server silently closed an idle keep-alive connection
+_STALE_ERRORS = (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError)
+
+
+class RestError(Exception):
+    """Non-2xx response from PostgREST"""
+
+
+def csv_body(columns, rows):
+    """text/csv body for a PostgREST insert: the header once, then one line per row
+
+    PostgREST reads an empty field as '' and NULL as NULL, so a text value
+    that is literally 'NULL' can't be sent as CSV: returns None in that case.
+    Strings are always quoted, everything else is sent as str(value).
+    """
+    lines = [','.join(columns)]
+    for row in rows:
+        fields = []
+        for value in row:
+            if value is None:
+                fields.append('NULL')
+            elif type(value) is str:
+                if value == 'NULL':
+                    return None
+                fields.append('"' + value.replace('"', '""') + '"')
+            else:
+                fields.append(str(value))
+        lines.append(','.join(fields))
+    return ('\n'.join(lines) + '\n').encode('utf-8')
+
+
+class SupabaseRest:
+    """Thread-safe PostgREST client that reuses keep-alive connections"""
+
+    def __init__(self, url, api_key, pool_size=4, timeout=30):
+        parts = urllib.parse.urlsplit(url)
+        self.connection_class = (
+            http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+        )
+        self.host = parts.hostname
+        self.port = parts.port
+        self.base_path = parts.path.rstrip('/')
+        self.timeout = timeout
+        self.headers = {'apikey': api_key, 'Authorization': f'Bearer {api_key}'}
+        self._idle = queue.LifoQueue(maxsize=pool_size)
+        self._lock = threading.Lock()
+        self.connections_opened = 0
+        self.requests_sent = 0
+
+    def _connect(self):
+        with self._lock:
+            self.connections_opened += 1
+        return self.connection_class(self.host, self.port, timeout=self.timeout)
+
+    def _send(self, conn, method, path, body, headers):
+        conn.request(method, self.base_path + path, body=body, headers=headers)
+        response = conn.getresponse()
+        return response, response.read()
+
+    def request(self, method, path, body=None, headers=None):
+        """Send one request on a pooled connection; return (status, body bytes)"""
+        all_headers = dict(self.headers, **(headers or {}))
+        try:
+            conn, reused = self._idle.get_nowait(), True
+        except queue.Empty:
+            conn, reused = self._connect(), False
+
+        try:
+            try:
+                response, data = self._send(conn, method, path, body, all_headers)
+            except _STALE_ERRORS:
+                if not reused:
+                    raise
+                # Idle connection was closed by the server: retry once on a fresh one
+                conn.close()
+                conn = self._connect()
+                response, data = self._send(conn, method, path, body, all_headers)
+        except Exception:
+            conn.close()
+            raise
+
+        with self._lock:
+            self.requests_sent += 1
+        if response.will_close:
+            conn.close()
+        else:
+            try:
+                self._idle.put_nowait(conn)
+            except queue.Full:
+                conn.close()
+        return response.status, data
+
+    def get_json(self, path):
+        """GET a PostgREST path and decode the JSON response"""
+        status, data = self.request('GET', path)
+        if not 200 <= status < 300:
+            raise RestError(f"HTTP {status}: {data.decode()}")
+        return json.loads(data)
+
+    def iter_ids(self, table, page_size=1000):
+        """Yield every id of table in ascending order using keyset pagination
+
+        Each page asks for id=gt.<last id seen>, which stays an index range
+        scan however deep into the table it is (unlike offset=N). Stops on an
+        empty page, so a server-side max-rows cap smaller than page_size
+        can't truncate the result.
+        """
+        last_id = None
+        while True:
+            path = f"/rest/v1/{table}?select=id&order=id.asc&limit={page_size}"
+            if last_id is not None:
+                path += f"&id=gt.{last_id}"
+            rows = self.get_json(path)
+            if not rows:
+                return
+            for row in rows:
+                yield row['id']
+            last_id = rows[-1]['id']
+
+    def insert(self, table, records, upsert=None, on_conflict=None, format='json'):
+        """Insert records into table; return (success, error) like insert_batch
+
+        upsert='ignore' makes the server skip rows whose key already exists,
+        upsert='merge' updates them. on_conflict names the unique column(s)
+        to resolve on and defaults to the primary key. format='csv' sends
+        the records as CSV (see insert_rows) when they all have the same keys.
+        """
+        if format == 'csv' and all(r.keys() == records[0].keys() for r in records):
+            columns = list(records[0])
+            return self.insert_rows(table, columns, [[r[c] for c in columns] for r in records],
+                                    upsert, on_conflict)
+        return self._post(table, json.dumps(records).encode('utf-8'), 'application/json',
+                          upsert, on_conflict)
+
+    def insert_rows(self, table, columns, rows, upsert=None, on_conflict=None):
+        """Insert row tuples (in `columns` order) as a text/csv body
+
+        Column names go out once per request instead of once per row as
+        JSON keys. Batches that can't be written as CSV are sent as JSON.
+        """
+        body = csv_body(columns, rows)
+        if body is None:
+            records = [dict(zip(columns, row)) for row in rows]
+            return self._post(table, json.dumps(records).encode('utf-8'), 'application/json',
+                              upsert, on_conflict)
+        return self._post(table, body, 'text/csv', upsert, on_conflict)
+
+    def _post(self, table, body, content_type, upsert, on_conflict):
+        path = f'/rest/v1/{table}'
+        prefer = 'return=minimal'
+        if upsert:
+            prefer += ',' + _RESOLUTIONS[upsert]
+            if on_conflict:
+                path += f'?on_conflict={on_conflict}'
+        headers = {'Content-Type': content_type, 'Prefer': prefer}
+        try:
+            status, data = self.request('POST', path, body, headers)
+        except Exception as e:
+            return False, str(e)
+        if 200 <= status < 300:
+            return True, None
+        return False, f"HTTP {status}: {data.decode()}"
+
+    def close(self):
+        """Close all idle connections"""
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Declarative MySQL -> Supabase table mappings
+
+Each TableSpec lists its target columns with their type, the MySQL
+expression they are selected from, the value that replaces NULL and an
+optional transform. The spec yields the SELECT, the type tuple for
+mysql_source.decode_row and a row converter generated once per table, so
+per-row work is a single flat function call with no per-column branching
+for columns that pass through unchanged.
+"""
+
+from decimal import Decimal
+
+
+class Column:
+    """One target column and how its value is read from MySQL"""
+
+    __slots__ = ('name', 'type', 'source', 'default', 'transform')
+
+    def __init__(self, name, type=str, source=None, default=None, transform=None):
+        self.name = name
+        self.type = type              # converter applied by decode_row (int, Decimal, str)
+        self.source = source or name  # SQL expression selected from MySQL
+        self.default = default        # value written instead of NULL
+        self.transform = transform    # callable applied to non-NULL values
+
+
+def compile_converter(columns):
+    """Generate convert(row) mapping a decoded source row to the target tuple
+
+    Columns without default or transform are copied as they are; when no
+    column needs work the rows are returned unchanged.
+    """
+    namespace = {}
+    exprs = []
+    for i, column in enumerate(columns):
+        value = f'v{i}'
+        if column.transform is not None:
+            namespace[f't{i}'] = column.transform
+            value = f'(None if v{i} is None else t{i}(v{i}))'
+        if column.default is not None:
+            namespace[f'd{i}'] = column.default
+            value = f'(d{i} if v{i} is None else {value})'
+        exprs.append(value)
+
+    if not namespace:
+        return lambda row: row
+
+    names = ', '.join(f'v{i}' for i in range(len(columns)))
+    source = f"def convert(row):\n    {names}, = row\n    return ({', '.join(exprs)},)\n"
+    exec(source, namespace)
+    return namespace['convert']
+
+
+class TableSpec:
+    """How one table is read from MySQL and written to Supabase"""
+
+    def __init__(self, table, columns, before=None, conflict=None, sequence=True):
+        self.table = table
+        self.columns = columns
+        self.before = before        # SQL run before the inserts (e.g. DELETE)
+        self.conflict = conflict    # ON CONFLICT clause closing every INSERT
+        self.sequence = sequence    # reset <table>_id_seq after loading
+        self.column_list = ', '.join(c.name for c in columns)
+        self.types = tuple(c.type for c in columns)
+        self.convert = compile_converter(columns)
+
+    def select(self, where=''):
+        """SELECT of the source columns, with an optional WHERE/ORDER BY tail"""
+        sql = f"SELECT {', '.join(c.source for c in self.columns)} FROM {self.table}"
+        return f"{sql} {where}" if where else sql
+
+
+BRANCHES = TableSpec('w_branches', [
+    Column('id', int), Column('name'), Column('email'), Column('phone1'), Column('phone2'),
+    Column('address1'), Column('address2'), Column('region'), Column('city'), Column('zip_code'),
+    Column('place_id'), Column('permission'), Column('branch_color'), Column('status'),
+], conflict="ON CONFLICT (id) DO UPDATE SET name = EXCLUDED.name, email = EXCLUDED.email, status = EXCLUDED.status")
+
+ACCOUNT_CATEGORIES = TableSpec('w_account_categories', [
+    Column('id', int), Column('name'), Column('type'), Column('revenue_type'),
+    Column('parent_id', int), Column('list_order', int, default=0),
+], before="DELETE FROM w_account_categories;")
+
+ACCOUNTS = TableSpec('w_accounts', [
+    Column('id', int), Column('account_name'), Column('account_type'), Column('status'),
+    Column('account_category', int), Column('list_order', int, default=0),
+], before="DELETE FROM w_accounts WHERE id NOT IN (SELECT DISTINCT account_id FROM w_register WHERE account_id IS NOT NULL);",
+   conflict="ON CONFLICT (id) DO UPDATE SET account_name = EXCLUDED.account_name")
+
+SERVICES = TableSpec('w_services', [
+    Column('id', int), Column('branch_id', int), Column('name'), Column('service_code'),
+    Column('description'), Column('price', Decimal, default=0), Column('category'), Column('status'),
+], before="DELETE FROM w_services;")
+
+USER_BRANCHES = TableSpec('w_user_branches', [
+    Column('user_id', int), Column('branch_id', int),
+], before="DELETE FROM w_user_branches;", conflict="ON CONFLICT (user_id, branch_id) DO NOTHING", sequence=False)
+
+ROOMS = TableSpec('w_rooms', [
+    Column('id', int), Column('branch_id', int), Column('room_name'),
+], before="DELETE FROM w_rooms;")
+
+VEHICLES = TableSpec('w_vehicles', [
+    Column('id', int), Column('branch_id', int), Column('brand'), Column('model'), Column('color'),
+    Column('plate_number'), Column('start_date'), Column('price_purchased', Decimal),
+    Column('end_date'), Column('price_sold', Decimal), Column('status'),
+], before="DELETE FROM w_vehicles;")
+
+CONTACTS = TableSpec('w_contacts', [
+    Column('id', int), Column('branch_id', int), Column('contact_type'), Column('contact_status'),
+    Column('company', default=''), Column('first_name', default=''), Column('middle_name', default=''),
+    Column('last_name'), Column('nick_name', default=''), Column('email', default=''),
+    Column('gender', default=''), Column('license_code', default=''), Column('referral_type', default=''),
+    Column('phone1', default=''), Column('phone2', default=''), Column('address1', default=''),
+    Column('address2', default=''), Column('region', default=''), Column('city', default=''),
+    Column('zip_code', default=''), Column('photo', default=''), Column('updated_by', int),
+    Column('created_at'), Column('updated_at'),
+])
+
+REGISTER = TableSpec('w_register', [
+    Column('id', int), Column('branch_id', int), Column('contact_id', int), Column('account_id', int),
+    Column('service_id', int), Column('register_type'), Column('register_status'),
+    Column('register_date'), Column('description', default=''), Column('received_by', int),
+    Column('cash', Decimal, default=0), Column('gcash', Decimal, default=0),
+    Column('bank', Decimal, default=0), Column('ar', Decimal, default=0),
+    Column('refund', Decimal, default=0), Column('expense_category', int),
+    Column('notes', default=''), Column('created_at'), Column('updated_at'), Column('updated_by', int),
+])
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Tests for the import pipeline's failure handling
+
+Run: python3 -m unittest discover -s scripts   (or python3 -m pytest scripts)
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+from import_pipeline import BatchSizer, FatalError, TransientError, bisect_batch, run_import
+
+ROWS = 300
+
+
+class Sender:
+    """send(batch) answering every request with `error` (None = success), counting them"""
+
+    def __init__(self, error=None, bad_ids=()):
+        self.error = error
+        self.bad_ids = set(bad_ids)
+        self.requests = 0
+        self.inserted = []
+        self._lock = threading.Lock()
+
+    def __call__(self, batch):
+        with self._lock:
+            self.requests += 1
+        if self.error:
+            return False, self.error
+        bad = [r['id'] for r in batch if r['id'] in self.bad_ids]
+        if bad:
+            return False, f'HTTP 409: duplicate key value (id)=({bad[0]}) already exists'
+        with self._lock:
+            self.inserted.extend(r['id'] for r in batch)
+        return True, None
+
+
+def records(n):
+    return [{'id': i} for i in range(1, n + 1)]
+
+
+class BisectTest(unittest.TestCase):
+
+    def test_row_errors_are_isolated(self):
+        send = Sender(bad_ids={7, 40})
+        inserted, rejects, _ = bisect_batch(records(64), send)
+        self.assertEqual(inserted, 62)
+        self.assertEqual(sorted(r['id'] for r, _ in rejects), [7, 40])
+
+    def test_fatal_error_is_not_split(self):
+        for error in ('HTTP 401: Invalid API key', 'HTTP 403: permission denied', 'HTTP 404: no such table'):
+            send = Sender(error)
+            with self.assertRaises(FatalError):
+                bisect_batch(records(64), send, error, delays=())
+            self.assertEqual(send.requests, 0, error)
+            with self.assertRaises(FatalError):
+                bisect_batch(records(64), send, delays=())
+            self.assertEqual(send.requests, 1, error)
+
+    def test_transient_error_is_resent_not_split(self):
+        send = Sender('HTTP 503: Service Unavailable')
+        with self.assertRaises(TransientError):
+            bisect_batch(records(64), send, delays=(0, 0))
+        self.assertEqual(send.requests, 3)
+
+
+class RunImportTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.dump = os.path.join(self.directory, 't.sql')
+        with open(self.dump, 'w') as f:
+            for i in range(1, ROWS + 1):
+                f.write(f"INSERT INTO t (id, name) VALUES ({i}, 'row {i}');\n")
+        self.journal = os.path.join(self.directory, 't.journal')
+        self.rejects = os.path.join(self.directory, 't_rejects.jsonl')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def run_import(self, send, dump=None):
+        return run_import('t', dump or self.dump, lambda columns, values: dict(zip(columns, values)), send,
+                          self.journal, self.rejects, BatchSizer(initial=100, min_size=100, max_size=100),
+                          concurrency=1)
+
+    def lines(self, path):
+        if not os.path.exists(path):
+            return []
+        with open(path) as f:
+            return f.readlines()
+
+    def test_rejected_key_stops_without_journal_or_rejects(self):
+        send = Sender('HTTP 401: Invalid API key')
+        inserted, rejected, stopped_at = self.run_import(send)
+        self.assertEqual((inserted, rejected, stopped_at), (0, 0, 1))
+        self.assertLessEqual(send.requests, 2)
+        self.assertEqual(self.lines(self.rejects), [])
+        self.assertEqual(self.lines(self.journal), [])
+
+        # Once the key is fixed, the rerun imports everything
+        send = Sender()
+        self.assertEqual(self.run_import(send), (ROWS, 0, None))
+        self.assertEqual(sorted(send.inserted), list(range(1, ROWS + 1)))
+
+    def test_key_revoked_mid_run_journals_only_the_batches_before(self):
+        send = Sender()
+        calls = []
+
+        def revoked_after_first(batch):
+            calls.append(batch)
+            if len(calls) > 1:
+                return False, 'HTTP 401: JWT expired'
+            return send(batch)
+
+        self.assertEqual(self.run_import(revoked_after_first), (100, 0, 2))
+        self.assertEqual(len(self.lines(self.journal)), 1)
+
+        self.assertEqual(self.run_import(send), (ROWS - 100, 0, None))
+        self.assertEqual(sorted(send.inserted), list(range(1, ROWS + 1)))
+
+    def test_bad_rows_are_journaled_and_rejected(self):
+        send = Sender(bad_ids={5, 250})
+        self.assertEqual(self.run_import(send), (ROWS - 2, 2, None))
+        self.assertEqual(len(self.lines(self.rejects)), 2)
+        self.assertEqual(len(self.lines(self.journal)), 3)
+
+        # A rerun resumes behind the last batch and sends nothing
+        send = Sender()
+        self.assertEqual(self.run_import(send), (0, 0, None))
+        self.assertEqual(send.requests, 0)
+
+    def test_piped_dump_is_not_journaled(self):
+        for _ in range(2):
+            send = Sender()
+            with open(self.dump) as stdin, mock.patch.object(sys, 'stdin', stdin):
+                self.assertEqual(self.run_import(send, '-'), (ROWS, 0, None))
+            self.assertEqual(sorted(send.inserted), list(range(1, ROWS + 1)))
+        self.assertEqual(self.lines(self.journal), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Tests for the large table export
+
+Run: python3 -m unittest discover -s scripts   (or python3 -m pytest scripts)
+"""
+
+import os
+import re
+import shutil
+import tempfile
+import types
+import unittest
+from unittest import mock
+
+import migrate_large_tables
+from mysql_source import MySQLError
+from staging import StageWriter
+from table_specs import CONTACTS, REGISTER
+
+_RANGE_RE = re.compile(r'WHERE id > (-?\d+) AND id <= (\d+) ORDER BY id LIMIT (\d+)')
+
+
+def fake_query(ids, spec):
+    """run_mysql_query answering MIN/MAX and keyset range queries over `ids`"""
+    def run(query, types):
+        if query.startswith('SELECT MIN(id), MAX(id)'):
+            return [(min(ids), max(ids))]
+        low, high, limit = map(int, _RANGE_RE.search(query).groups())
+        rows = [i for i in ids if low < i <= high][:limit]
+        return [(i,) + (None,) * (len(spec.columns) - 1) for i in rows]
+    return run
+
+
+def mysql_down(query, types):
+    raise MySQLError("Can't connect to local MySQL server")
+
+
+class ExportTableTest(unittest.TestCase):
+
+    def test_rows_come_out_in_id_order(self):
+        ids = [i for i in range(1, 1000) if i % 7]
+        with mock.patch.object(migrate_large_tables, 'run_mysql_query', fake_query(ids, REGISTER)):
+            rows = migrate_large_tables.export_table(REGISTER, 50, shards=4)
+            self.assertIsInstance(rows, types.GeneratorType)
+            self.assertEqual([row[0] for row in rows], ids)
+
+    def test_reuse_stage_does_not_query_mysql(self):
+        directory = tempfile.mkdtemp()
+        try:
+            for spec in (CONTACTS, REGISTER):
+                writer = StageWriter(os.path.join(directory, f'{spec.table}.stage'), spec.table,
+                                     [c.name for c in spec.columns], source='mysql')
+                for i in range(1, 4):
+                    writer.write(spec.convert((i,) + (None,) * (len(spec.columns) - 1)))
+                writer.close()
+
+            with mock.patch.object(migrate_large_tables, 'run_mysql_query', mysql_down), \
+                    mock.patch.object(migrate_large_tables, 'REUSE_STAGE', True), \
+                    mock.patch.object(migrate_large_tables, 'EXPORT_DIR', directory):
+                migrate_large_tables.main()
+
+            for name in ('contacts_import.sql', 'register_import.sql'):
+                with open(os.path.join(directory, name)) as f:
+                    self.assertEqual(sum(line.startswith('INSERT INTO') for line in f), 3, name)
+        finally:
+            shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Tests for running table migrations in foreign-key order
+
+Run: python3 -m unittest discover -s scripts   (or python3 -m pytest scripts)
+"""
+
+import os
+import tempfile
+import unittest
+from functools import partial
+from unittest import mock
+
+import migrate_mysql_to_supabase
+from migration_graph import run_tables
+from mysql_source import MySQLError
+
+# The tables migrate_all.py exports
+ALL_TABLES = list(migrate_mysql_to_supabase.MIGRATIONS) + ['w_contacts', 'w_register']
+
+
+class FailingSource:
+    """MySQL source whose queries on `table` yield one row and then fail (others yield none)"""
+
+    def __init__(self, table):
+        self.table = table
+
+    def rows(self, query, types):
+        if query.endswith(f'FROM {self.table}'):
+            yield tuple(convert('1') for convert in types)
+            raise MySQLError("Lost connection to MySQL server during query")
+
+
+class RunTablesTest(unittest.TestCase):
+
+    def run_all(self, tasks):
+        results = run_tables(tasks, migrate_mysql_to_supabase.table_dependencies(), max_workers=4)
+        return {run.table: run for run in results}
+
+    def test_failed_table_skips_register(self):
+        ran = []
+
+        def task(table):
+            ran.append(table)
+            if table == 'w_contacts':
+                raise MySQLError("Table 'wvdi_local.w_contacts' doesn't exist")
+
+        runs = self.run_all({table: partial(task, table) for table in ALL_TABLES})
+        self.assertEqual(runs['w_contacts'].status, 'failed')
+        self.assertEqual(runs['w_register'].status, 'skipped')
+        self.assertIn('w_contacts', runs['w_register'].error)
+        self.assertNotIn('w_register', ran)
+        self.assertEqual(runs['w_services'].status, 'ok')
+
+    def test_query_failing_part_way_fails_table(self):
+        output_dir = tempfile.mkdtemp()
+        tasks = {table: partial(migrate_mysql_to_supabase.generate_sql_file, table)
+                 for table in migrate_mysql_to_supabase.MIGRATIONS}
+        tasks['w_contacts'] = tasks['w_register'] = lambda: None
+        with mock.patch.object(migrate_mysql_to_supabase, 'source', FailingSource('w_branches')), \
+                mock.patch.object(migrate_mysql_to_supabase, 'OUTPUT_DIR', output_dir):
+            runs = self.run_all(tasks)
+
+        self.assertEqual(runs['w_branches'].status, 'failed')
+        self.assertIn('Lost connection', runs['w_branches'].error)
+        for table in ('w_account_categories', 'w_accounts'):
+            self.assertEqual(runs[table].status, 'ok', table)
+        for table in ('w_services', 'w_rooms', 'w_contacts', 'w_register'):
+            self.assertEqual(runs[table].status, 'skipped', table)
+        self.assertEqual(os.listdir(output_dir), [])  # no partial file left behind
+        os.rmdir(output_dir)
+
+
+if __name__ == "__main__":
+    unittest.main()
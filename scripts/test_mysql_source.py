@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Tests for the mysql client sessions, against a stub `docker exec ... mysql`
+
+The stub understands a few statements ('ROWS n', 'EXIT', the end marker
+query; anything else is an error written to stderr) and, like mysql writing
+to a pipe, holds its output until exit unless it runs with --unbuffered.
+
+Run: python3 -m unittest discover -s scripts   (or python3 -m pytest scripts)
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+from mysql_source import MySQLError, MySQLSource
+
+STUB_DOCKER = r'''
+import re
+import signal
+import sys
+
+signal.alarm(20)  # a test that hangs on the stub's output still ends
+args = sys.argv
+sys.stderr.write("mysql: [Warning] Using a password on the command line interface can be insecure.\n")
+sys.stderr.flush()
+if '--unbuffered' not in args and '-e' not in args:
+    sys.stdout = open(sys.stdout.fileno(), 'w', buffering=1 << 20)  # flushed at exit only
+
+
+def run(statement, errors):
+    statement = statement.strip()
+    m = re.match(r"SELECT '(\w+)', @@error_count", statement)
+    if m:
+        print(f"{m.group(1)}\t{errors}")
+        return 0
+    if statement == 'SELECT 1':
+        print(1)
+        return 0
+    if statement.startswith('ROWS '):
+        for i in range(int(statement.split()[1])):
+            print(f"{i}\tname {i}")
+        return 0
+    if statement == 'EXIT':
+        sys.stderr.write("ERROR 2013 (HY000): Lost connection to MySQL server during query\n")
+        sys.exit(1)
+    sys.stderr.write(f"ERROR 1064 (42000) at line 1: bad statement {statement!r}\n")
+    sys.stderr.flush()
+    return errors + 1
+
+
+if '-e' in args:
+    sys.exit(1 if run(args[args.index('-e') + 1], 0) else 0)
+errors = 0
+for line in sys.stdin:
+    errors = run(line.rstrip(';\n'), errors)
+    if '--unbuffered' in args:
+        sys.stdout.flush()
+'''
+
+
+def within(seconds, function):
+    """function() run in a thread, failing if it takes longer than seconds (e.g. a hung pipe)"""
+    outcome = {}
+
+    def run():
+        try:
+            outcome['result'] = function()
+        except Exception as e:
+            outcome['error'] = e
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    thread.join(seconds)
+    if thread.is_alive():
+        raise AssertionError(f"no result after {seconds}s")
+    if 'error' in outcome:
+        raise outcome['error']
+    return outcome['result']
+
+
+class MySQLSourceTest(unittest.TestCase):
+
+    def setUp(self):
+        self.bin = tempfile.mkdtemp()
+        docker = os.path.join(self.bin, 'docker')
+        with open(docker, 'w') as f:
+            f.write(f"#!{sys.executable}\n{STUB_DOCKER}")
+        os.chmod(docker, 0o755)
+        path = mock.patch.dict(os.environ, {'PATH': self.bin + os.pathsep + os.environ['PATH']})
+        path.start()
+        self.addCleanup(path.stop)
+        self.source = MySQLSource('mysql-1', 'root', 'secret', 'wvdi_local')
+
+    def tearDown(self):
+        self.source.close()
+        shutil.rmtree(self.bin)
+
+    def rows(self, sql):
+        return within(10, lambda: list(self.source.rows(sql, (int, str))))
+
+    def test_rows_stream_through_one_session(self):
+        self.assertEqual(self.rows('ROWS 3'), [(0, 'name 0'), (1, 'name 1'), (2, 'name 2')])
+        self.assertEqual(len(self.rows('ROWS 500')), 500)
+        self.assertEqual(self.rows('ROWS 0'), [])
+        self.assertTrue(self.source.persistent)
+        self.assertEqual(len(self.source._sessions), 1)
+
+    def test_error_raises_and_session_stays_usable(self):
+        with self.assertRaisesRegex(MySQLError, 'bad statement'):
+            self.rows('SELECT * FROM missing')
+        self.assertEqual(len(self.rows('ROWS 2')), 2)
+        with self.assertRaisesRegex(MySQLError, 'another'):
+            self.rows('another bad one')
+        self.assertEqual(len(self.source._sessions), 1)
+
+    def test_abandoned_result_is_drained(self):
+        result = self.source.query('ROWS 1000')
+        self.assertEqual(next(result), '0\tname 0')
+        result.close()
+        self.assertEqual(self.rows('ROWS 7'), [(i, f'name {i}') for i in range(7)])
+        self.assertEqual(len(self.source._sessions), 1)
+
+    def test_client_exit_raises_and_drops_the_session(self):
+        with self.assertRaisesRegex(MySQLError, 'client exited: .*Lost connection'):
+            self.rows('EXIT')
+        self.assertEqual(self.source._sessions, [])
+        self.assertEqual(len(self.rows('ROWS 1')), 1)
+
+    def test_concurrent_queries_share_a_bounded_pool(self):
+        sizes = [100, 200, 300, 400, 500]
+        for _ in range(3):
+            with ThreadPoolExecutor(4) as pool:
+                counts = within(30, lambda: list(pool.map(lambda n: len(self.rows(f'ROWS {n}')), sizes)))
+            self.assertEqual(counts, sizes)
+        self.assertLessEqual(len(self.source._sessions), 4)
+        self.assertEqual(self.source.queries, 15)
+
+    def test_docker_exec_per_query(self):
+        self.source.persistent = False
+        self.assertEqual(self.rows('ROWS 2'), [(0, 'name 0'), (1, 'name 1')])
+        with self.assertRaisesRegex(MySQLError, 'bad statement'):
+            self.rows('nonsense')
+        self.assertEqual(self.source._sessions, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Tests for the Postgres sinks
+
+The COPY and INSERT round trips run against the Postgres at DATABASE_URL
+(e.g. a local one: DATABASE_URL=postgresql://localhost/postgres) and are
+skipped without it.
+
+Run: python3 -m unittest discover -s scripts   (or python3 -m pytest scripts)
+"""
+
+import csv
+import io
+import os
+import unittest
+from decimal import Decimal
+
+from postgres_sink import CsvStream, copy_records, copy_rows, insert_records, insert_rows
+
+try:
+    import psycopg2
+except ImportError:
+    psycopg2 = None
+else:
+    import batch_import_contacts  # pip installs psycopg2 when imported without it
+
+DATABASE_URL = os.environ.get('DATABASE_URL')
+
+ROWS = [
+    (1, 'plain', None, Decimal('1.50')),
+    (2, '', 'empty string, not NULL', None),
+    (3, 'say "hi", twice', 'comma, and "quotes"', Decimal('-2')),
+    (4, 'two\nlines\r\n', 'café, 日本', Decimal('0')),
+    (5, None, '\\N', Decimal('1e3')),
+]
+
+
+def read_all(stream, size):
+    chunks = []
+    while True:
+        chunk = stream.read(size)
+        if not chunk:
+            return chunks
+        chunks.append(chunk)
+
+
+class CsvStreamTest(unittest.TestCase):
+
+    def test_null_and_empty_string(self):
+        self.assertEqual(CsvStream([(None, '', 0, 'x')]).read(), b',"",0,"x"\n')
+
+    def test_quotes_and_newlines_round_trip(self):
+        data = CsvStream(ROWS).read().decode('utf-8')
+        parsed = list(csv.reader(io.StringIO(data, newline='')))
+        self.assertEqual([row[1] for row in parsed], ['plain', '', 'say "hi", twice', 'two\nlines\r\n', ''])
+        self.assertEqual([row[2] for row in parsed][2:], ['comma, and "quotes"', 'café, 日本', '\\N'])
+
+    def test_chunk_boundaries(self):
+        whole = CsvStream(ROWS).read()
+        for size in (1, 2, 7, 16, len(whole) - 1, len(whole), len(whole) + 1, 65536):
+            stream = CsvStream(ROWS)
+            chunks = read_all(stream, size)
+            self.assertEqual(b''.join(chunks), whole, size)
+            self.assertTrue(all(len(chunk) <= size for chunk in chunks), size)
+            self.assertTrue(all(len(chunk) == size for chunk in chunks[:-1]), size)
+            self.assertEqual(stream.rows, len(ROWS), size)
+
+    def test_read_all_after_partial_read(self):
+        whole = CsvStream(ROWS).read()
+        stream = CsvStream(ROWS)
+        head = stream.read(10)
+        self.assertEqual(head + stream.read(), whole)
+        self.assertEqual(stream.read(), b'')
+        self.assertEqual(stream.read(10), b'')
+
+    def test_no_rows(self):
+        stream = CsvStream([])
+        self.assertEqual(stream.read(100), b'')
+        self.assertEqual(stream.rows, 0)
+
+
+@unittest.skipUnless(DATABASE_URL and psycopg2, "set DATABASE_URL (and install psycopg2) to run")
+class PostgresSinkTest(unittest.TestCase):
+
+    COLUMNS = ('id', 'name', 'check', 'amount')
+
+    def setUp(self):
+        self.conn = psycopg2.connect(DATABASE_URL)
+        with self.conn.cursor() as cursor:
+            # "check" is a reserved word, like the w_register column
+            cursor.execute('CREATE TEMP TABLE sink_test '
+                           '(id INTEGER PRIMARY KEY, name TEXT, "check" TEXT, amount NUMERIC(10, 2))')
+        self.conn.commit()
+
+    def tearDown(self):
+        self.conn.close()
+
+    def table(self):
+        with self.conn.cursor() as cursor:
+            cursor.execute('SELECT id, name, "check", amount FROM sink_test ORDER BY id')
+            rows = cursor.fetchall()
+        self.conn.commit()
+        return rows
+
+    def test_copy_round_trip(self):
+        self.assertEqual(copy_rows(self.conn, 'sink_test', self.COLUMNS, iter(ROWS), size=7), len(ROWS))
+        self.assertEqual(self.table(), ROWS)
+
+    def test_copy_records(self):
+        records = [dict(zip(self.COLUMNS, row)) for row in ROWS]
+        self.assertEqual(copy_records(self.conn, 'sink_test', records), len(ROWS))
+        self.assertEqual(self.table(), ROWS)
+
+    def test_failed_copy_leaves_nothing(self):
+        with self.assertRaises(psycopg2.IntegrityError):
+            copy_rows(self.conn, 'sink_test', self.COLUMNS, ROWS + [ROWS[0]])
+        self.assertEqual(self.table(), [])
+        self.assertEqual(copy_rows(self.conn, 'sink_test', self.COLUMNS, ROWS), len(ROWS))
+
+    def test_insert_rows_in_pages(self):
+        self.assertEqual(insert_rows(self.conn, 'sink_test', self.COLUMNS, iter(ROWS), page_size=2), len(ROWS))
+        self.assertEqual(self.table(), ROWS)
+
+    def test_insert_records_skips_present_ids(self):
+        insert_rows(self.conn, 'sink_test', self.COLUMNS, ROWS[:2])
+        changed = [(id, 'changed', None, None) for id, *_ in ROWS]
+        records = [dict(zip(self.COLUMNS, row)) for row in changed]
+        self.assertEqual(insert_records(self.conn, 'sink_test', records, on_conflict='id'), len(ROWS))
+        self.assertEqual(self.table(), ROWS[:2] + changed[2:])
+
+        with self.assertRaises(psycopg2.IntegrityError):
+            insert_records(self.conn, 'sink_test', records)
+
+    def test_contacts_already_imported_are_skipped(self):
+        with self.conn.cursor() as cursor:
+            cursor.execute('CREATE TEMP TABLE w_contacts (id INTEGER PRIMARY KEY, first_name TEXT)')
+        self.conn.commit()
+        insert_rows(self.conn, 'w_contacts', ('id', 'first_name'), [(i, 'by hand') for i in range(1, 21)])
+
+        records = [{'id': i, 'first_name': f'dump {i}'} for i in range(1, 51)]
+        self.assertTrue(batch_import_contacts.execute_batch(self.conn, records, 1))
+        with self.conn.cursor() as cursor:
+            cursor.execute('SELECT first_name, COUNT(*) FROM w_contacts GROUP BY 1 ORDER BY 1')
+            counts = dict(cursor.fetchall())
+        self.assertEqual(counts.pop('by hand'), 20)
+        self.assertEqual(len(counts), 30)
+
+
+if __name__ == "__main__":
+    unittest.main()
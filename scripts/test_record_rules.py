@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Tests for the generated build_record functions of the bulk importers
+
+Each one is compared with the hand-written build_record it replaced, on
+randomized rows, with the full column list of the export and with columns
+missing from the dump's INSERT statements.
+
+Run: python3 -m unittest discover -s scripts   (or python3 -m pytest scripts)
+"""
+
+import random
+import unittest
+
+import bulk_import_contacts
+import bulk_import_register
+from table_specs import CONTACTS, REGISTER
+
+ROWS = 2000
+
+
+def baseline_contact(columns, values):
+    """bulk_import_contacts.build_record before RecordRules"""
+    result = dict(zip(columns, values))
+    if result.get('contact_type'):
+        ct = result['contact_type'].lower()
+        result['contact_type'] = bulk_import_contacts.CONTACT_TYPE_MAP.get(ct, ct.upper())
+    if result.get('contact_status') is not None:
+        result['contact_status'] = bulk_import_contacts.CONTACT_STATUS_MAP.get(result['contact_status'], 'Active')
+    else:
+        result['contact_status'] = 'Active'
+    if result.get('branch_id') == 0:
+        result['branch_id'] = 1
+    return result
+
+
+def baseline_register(columns, values):
+    """bulk_import_register.build_record before RecordRules"""
+    result = dict(zip(columns, values))
+    if result.get('branch_id') == 0:
+        result['branch_id'] = 1
+    for column in ('transfer_account_id', 'transfer_register_id', 'category_id', 'service_id', 'contact_id'):
+        if result.get(column) == 0:
+            result[column] = None
+    return result
+
+
+# Values drawn for the columns the rules look at; other columns get any of OTHER
+CHOICES = {
+    'contact_type': ['student', 'Employee', 'AGENT', 'supplier', 'other', '', None],
+    'contact_status': ['A', 'I', 'Active', 'Inactive', '', 'X', None],
+    'branch_id': [0, 1, 2, None],
+    'transfer_account_id': [0, 3, None],
+    'transfer_register_id': [0, 4, None],
+    'category_id': [0, 5, None],
+    'service_id': [0, 6, None],
+    'contact_id': [0, 7, None],
+}
+OTHER = [None, 0, 1, '', 'text', 2.5]
+
+
+class BuildRecordTest(unittest.TestCase):
+
+    def check(self, module, baseline, columns):
+        """Compare module.build_record with baseline on random rows; check the rule counters"""
+        rules = module.RULES
+        rules.counts[:] = [0] * len(rules.counts)  # the generated code keeps this list
+        expected = [0] * len(rules.rules)
+        rng = random.Random(len(columns))
+        columns = tuple(columns)
+        for i in range(ROWS):
+            values = tuple(i if c == 'id' else rng.choice(CHOICES.get(c, OTHER)) for c in columns)
+            record = module.build_record(columns, values)
+            self.assertEqual(record, baseline(columns, values), values)
+            row = dict(zip(columns, values))
+            for r, rule in enumerate(rules.rules):
+                if rule.missing:
+                    expected[r] += rule.column not in row
+                elif rule.column in row and record[rule.column] != row[rule.column]:
+                    expected[r] += 1
+        self.assertEqual(rules.counts, expected)
+        return expected
+
+    def test_contacts_full_columns(self):
+        counts = self.check(bulk_import_contacts, baseline_contact, [c.name for c in CONTACTS.columns])
+        # Every rule fired but default('contact_status', 'Active'), which is for dumps without it
+        self.assertEqual([count > 0 for count in counts], [True, True, False, True])
+
+    def test_contacts_without_status(self):
+        columns = [c.name for c in CONTACTS.columns if c.name != 'contact_status']
+        counts = self.check(bulk_import_contacts, baseline_contact, columns)
+        self.assertEqual(counts[2], ROWS)  # default('contact_status', 'Active')
+
+    def test_contacts_without_type_or_status(self):
+        columns = [c.name for c in CONTACTS.columns if c.name not in ('contact_type', 'contact_status')]
+        self.check(bulk_import_contacts, baseline_contact, columns)
+
+    def test_contacts_other_column_order(self):
+        columns = [c.name for c in CONTACTS.columns][::-1]
+        self.check(bulk_import_contacts, baseline_contact, columns)
+
+    def test_register_full_columns(self):
+        columns = [c.name for c in REGISTER.columns]
+        counts = self.check(bulk_import_register, baseline_register, columns)
+        # The export has no transfer or category columns, so only the other rules fire
+        self.assertEqual([count > 0 for count in counts],
+                         [rule.column in columns for rule in bulk_import_register.RULES.rules])
+
+    def test_register_all_keys(self):
+        columns = [c.name for c in REGISTER.columns] + ['transfer_account_id', 'transfer_register_id', 'category_id']
+        counts = self.check(bulk_import_register, baseline_register, columns)
+        self.assertTrue(all(counts))
+
+    def test_register_without_optional_keys(self):
+        columns = [c.name for c in REGISTER.columns if c.name not in ('contact_id', 'service_id')]
+        counts = self.check(bulk_import_register, baseline_register, columns)
+        self.assertEqual(counts[4:], [0, 0])
+
+
+if __name__ == "__main__":
+    unittest.main()
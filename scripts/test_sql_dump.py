@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Tests for the sql_dump tokenizer
+
+Run: python3 -m unittest discover -s scripts   (or python3 -m pytest scripts)
+"""
+
+import time
+import unittest
+
+from sql_dump import iter_dump_rows, sql_literal
+
+
+def rows(*lines, table=None):
+    """Parsed (columns, values) of a dump given as lines"""
+    return list(iter_dump_rows([line + '\n' for line in lines], table))
+
+
+def values(line):
+    return [v for _, v in rows(line)]
+
+
+class TokenizerTest(unittest.TestCase):
+
+    def test_typed_values(self):
+        self.assertEqual(rows("INSERT INTO `t` (`id`, `a`, `b`, `c`) VALUES (1, NULL, 2.5, 'x');"),
+                         [(('id', 'a', 'b', 'c'), (1, None, 2.5, 'x'))])
+
+    def test_extended_insert(self):
+        self.assertEqual(values("INSERT INTO t (a, b) VALUES (1, 'x'), (2, 'y'),(3,'z');"),
+                         [(1, 'x'), (2, 'y'), (3, 'z')])
+
+    def test_doubled_quote(self):
+        self.assertEqual(values("INSERT INTO t (a) VALUES ('it''s'), ('''');"), [("it's",), ("'",)])
+
+    def test_backslash_escapes(self):
+        self.assertEqual(values(r"INSERT INTO t (a) VALUES ('it\'s'), ('a\nb\tc'), ('back\\slash'), ('\%');"),
+                         [("it's",), ('a\nb\tc',), ('back\\slash',), ('%',)])
+
+    def test_parens_and_commas_in_strings(self):
+        self.assertEqual(values("INSERT INTO t (a, b) VALUES ('(a, b)', ')');"), [('(a, b)', ')')])
+
+    def test_e_string(self):
+        self.assertEqual(values(r"INSERT INTO t (a, b) VALUES (E'line\nbreak', e'tab\there');"),
+                         [('line\nbreak', 'tab\there')])
+
+    def test_sql_literal_round_trip(self):
+        for value in ["plain", "it's", "back\\slash", "two\nlines\r\n", "", None, 42, -1.5]:
+            line = f"INSERT INTO t (a) VALUES ({sql_literal(value)});"
+            self.assertEqual(values(line), [(value,)], line)
+
+    def test_multiline_extended_insert(self):
+        self.assertEqual(rows("INSERT INTO t (a) VALUES", "(1),", "(2);", "INSERT INTO u (a) VALUES (3);",
+                              table='t'),
+                         [(('a',), (1,)), (('a',), (2,))])
+
+    def test_unclosed_tuple_fails_fast(self):
+        # Used to backtrack exponentially in the length of the tuple
+        lines = [
+            "INSERT INTO w_register (id,a,b,c,d,e) VALUES (100001, 12345, 67890, 13579, 24680, NOW());",
+            "INSERT INTO t (a, b) VALUES (1, 'raw line break",
+            "INSERT INTO t (a) VALUES (" + 'x' * 10000,
+        ]
+        for line in lines:
+            start = time.perf_counter()
+            with self.assertRaises(ValueError):
+                rows(line)
+            self.assertLess(time.perf_counter() - start, 1.0, line[:40])
+
+
+if __name__ == "__main__":
+    unittest.main()